@@ -0,0 +1,68 @@
+import argparse
+import time
+import tracemalloc
+import simulator
+from simulator import EventUnit
+
+
+class LegacyEventUnit:
+    # event as it was before the opcode dispatch: bound method, its name and kwargs kept in every event
+    def __init__(self, dev_id, timestamp, f, *args, **kwargs):
+        self.dev_id = dev_id
+        self.timestamp = timestamp
+        self.func = f
+        self.func_name = f.__name__
+        self.args = args
+        self.kwargs = kwargs
+        self.seq = -1
+        self.expired = False
+
+    def execute(self):
+        simulator.SIM_TIME = self.timestamp
+        dev = simulator.LIST_OF_DEVICES[self.dev_id]
+        dev.timestamp = simulator.SIM_TIME
+        dev.current_event_timestamp = simulator.SIM_TIME
+        self.func(*self.args, **self.kwargs)
+        dev.previous_event_timestamp = simulator.SIM_TIME
+
+
+class BenchDevice:
+    __slots__ = ('timestamp', 'current_event_timestamp', 'previous_event_timestamp')
+
+    def _change_radio_state(self, state, substate=None):
+        pass
+
+
+def create_legacy(dev, n):
+    return [LegacyEventUnit(0, i, dev._change_radio_state, 'ON', 'RX') for i in range(n)]
+
+
+def create_opcode(dev, n):
+    return [EventUnit(0, i, EventUnit.get_opcode(dev._change_radio_state), ('ON', 'RX')) for i in range(n)]
+
+
+def run(name, create, dev, n):
+    tracemalloc.start()
+    start = time.perf_counter()
+    events = create(dev, n)
+    create_s = time.perf_counter() - start
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    for event in events:
+        event.execute()
+    execute_s = time.perf_counter() - start
+
+    print(f'{name:8s}: {memory / n:6.0f} B/event, create {create_s * 1e9 / n:5.0f} ns/event, execute {execute_s * 1e9 / n:5.0f} ns/event')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser('Compares the memory and speed of the legacy and the opcode based events')
+    parser.add_argument('-n', help='Number of events', type=int, default=1000000)
+    args = parser.parse_args()
+
+    dev = BenchDevice()
+    simulator.LIST_OF_DEVICES = [dev]
+    run('legacy', create_legacy, dev, args.n)
+    run('opcode', create_opcode, dev, args.n)
@@ -0,0 +1,54 @@
+import math
+from numpy import random
+
+PPM = 1000000
+
+CLOCK_DRIFT_FIXED = 'fixed'
+CLOCK_DRIFT_UNIFORM = 'uniform'
+CLOCK_DRIFT_NORMAL = 'normal'
+CLOCK_DRIFT_DISTRIBUTION = [CLOCK_DRIFT_FIXED, CLOCK_DRIFT_UNIFORM, CLOCK_DRIFT_NORMAL]
+
+class Clock:
+    # Local clock of a device. The clock runs ppm faster (negative) or slower than the simulation time, so local time
+    # l corresponds to the simulation time offset + l * (1 + rate). The offset between both clocks is kept fractional
+    # and grows with the local time, so the drift adds up over the cycles even when a single interval drifts by less
+    # than one unit. Deadlines are converted to the simulation time once, when an event is scheduled, so future events
+    # never have to be moved.
+    def __init__(self, ppm=0, negative=False, offset=0.0):
+        self.ppm = ppm
+        self.negative = negative
+        self.offset = offset
+
+    @staticmethod
+    def draw_ppm(cdppm, distribution=CLOCK_DRIFT_FIXED):
+        if distribution not in CLOCK_DRIFT_DISTRIBUTION:
+            raise RuntimeError(f'Given clock drift distribution: {distribution} is not valid!')
+
+        if distribution == CLOCK_DRIFT_UNIFORM:
+            return random.uniform(0.0, cdppm)
+
+        if distribution == CLOCK_DRIFT_NORMAL:
+            # clipped to cdppm, the guard time set by -gto covers only drifts up to cdppm
+            return min(abs(random.normal(0.0, cdppm)), cdppm)
+
+        return cdppm
+
+    def get_rate(self):
+        rate = self.ppm / PPM
+        if self.negative:
+            return -rate
+
+        return rate
+
+    def to_local(self, now):
+        # local time of the simulation time now. Events of the device are scheduled at whole local units, so the
+        # simulation time they were rounded to is mapped back to the exact local deadline
+        return math.floor((now - self.offset) / (1 + self.get_rate()) + 0.5)
+
+    def to_global(self, now, timestamp):
+        # timestamp is a deadline measured by this clock from now
+        if self.ppm == 0 and self.offset == 0:
+            return timestamp
+
+        deadline = self.to_local(now) + timestamp - now
+        return math.floor(self.offset + deadline * (1 + self.get_rate()) + 0.5)
@@ -1,9 +1,15 @@
 import subprocess
 import argparse
+import bz2
+import os
 import shlex
+import shutil
 import json
+import time
 from pathlib import Path
 from utils import natural_keys
+from logger import LOG_COMPRESSION, get_log_segments_path
+from log_reader import get_log_files
 from analyse import read_status
 import re
 from shutil import which
@@ -13,27 +19,46 @@ def compress(file_name, remove_log):
         config = json.load(f)
     sim_time = config['general']['sim_duration_s']
 
-    log_file = file_name.replace('config.json', 'log.txt')
+    # a segmented log is a list of files, the summary of the simulation is at the end of the last one
+    log_files = get_log_files(file_name.replace('config.json', 'log.txt'))
     stats_file = file_name.replace('config.json', 'stats.txt')
-    if not Path(stats_file).is_file():
+    if not Path(stats_file).is_file() and len(log_files) > 0:
         # print(f'[{stats_file}]: does not exist! Creating new summary first...')
         log_path = file_name.replace('/config.json', '')
-        log_name = 'log.txt'
+        log_name = os.path.basename(log_files[-1])
         read_status(log_path, log_name, sim_time, True)
 
-    bz2_log_file = file_name.replace('config.json', 'log.txt.bz2')
+    for log_file in log_files:
+        _compress_file(log_file, remove_log)
+
+    _update_segments(file_name.replace('config.json', 'log.txt'))
+
+def _compress_file(log_file, remove_log):
+    if log_file.endswith(tuple(x[1] for x in LOG_COMPRESSION.values())):
+        print(f'[{log_file}]: compressed by the simulator.')
+        return
+
+    bz2_log_file = f'{log_file}.bz2'
     if not Path(bz2_log_file).is_file():
-        args = shlex.split(f"pbzip2 -v {log_file}")
-        process = subprocess.run(args, capture_output=True)
-        if len(process.stderr) > 0:
-            try:
-                input_size, output_size, wall_clock = _read_process_output(process)
-            except RuntimeError:
-                print(f'[{log_file}]: not compressed :(')
-                return
-            print(f'[{log_file}]: {round(input_size / 1024.0 / 1024.0, 2)}MB -> {round(output_size / 1024.0 / 1024.0, 2)}MB in {wall_clock}s.')
+        if which('pbzip2') is None:
+            # slower, but does not need pbzip2
+            started = time.time()
+            with open(log_file, 'rb') as f_in, bz2.open(bz2_log_file, 'wb') as f_out:
+                shutil.copyfileobj(f_in, f_out)
+            input_size, output_size = os.path.getsize(log_file), os.path.getsize(bz2_log_file)
+            print(f'[{log_file}]: {round(input_size / 1024.0 / 1024.0, 2)}MB -> {round(output_size / 1024.0 / 1024.0, 2)}MB in {round(time.time() - started, 2)}s.')
         else:
-            print(f'[{log_file}]: not compressed :(')
+            args = shlex.split(f"pbzip2 -v {log_file}")
+            process = subprocess.run(args, capture_output=True)
+            if len(process.stderr) > 0:
+                try:
+                    input_size, output_size, wall_clock = _read_process_output(process)
+                except RuntimeError:
+                    print(f'[{log_file}]: not compressed :(')
+                    return
+                print(f'[{log_file}]: {round(input_size / 1024.0 / 1024.0, 2)}MB -> {round(output_size / 1024.0 / 1024.0, 2)}MB in {wall_clock}s.')
+            else:
+                print(f'[{log_file}]: not compressed :(')
     else:
         print(f'[{log_file}]: already compressed.')
 
@@ -45,12 +70,42 @@ def compress(file_name, remove_log):
         else:
             print(f'[{log_file}]: file still exists. If you want to remove it run the command again with -f flag!')
 
+def _update_segments(log_file):
+    # log.index.json has to list the compressed segments once the uncompressed ones are removed
+    segments_path = get_log_segments_path(log_file)
+    if not Path(segments_path).is_file():
+        return
+
+    with open(segments_path, 'r') as f:
+        index = json.load(f)
+
+    directory = os.path.dirname(log_file)
+    for segment in index['segments']:
+        if not Path(directory, segment['file']).is_file() and Path(directory, f'{segment["file"]}.bz2').is_file():
+            segment['file'] = f'{segment["file"]}.bz2'
+
+    if all(x['file'].endswith('.bz2') for x in index['segments']):
+        index['compression'] = 'bz2'
+
+    with open(segments_path, 'w') as outfile:
+        outfile.write(json.dumps(index, indent=4))
+
 def decompress(file_name, empty_flag=None):
     if not Path(file_name).is_file():
         print(f'[{file_name}]: does not exist!')
         return
 
-    if not Path(file_name.replace('.bz2', '')).is_file():
+    log_file, suffix = os.path.splitext(file_name)
+    if not Path(log_file).is_file():
+        if suffix != '.bz2' or which('pbzip2') is None:
+            started = time.time()
+            opener = [x[0] for x in LOG_COMPRESSION.values() if x[1] == suffix][0]
+            with opener(file_name, 'rb') as f_in, open(log_file, 'wb') as f_out:
+                shutil.copyfileobj(f_in, f_out)
+            input_size, output_size = os.path.getsize(file_name), os.path.getsize(log_file)
+            print(f'[{file_name}]: {round(input_size / 1024.0 / 1024.0, 2)}MB -> {round(output_size / 1024.0 / 1024.0, 2)}MB in {round(time.time() - started, 2)}s.')
+            return
+
         args = shlex.split(f"pbzip2 -v -k -d {file_name}")
         process = subprocess.run(args, capture_output=True)
         if len(process.stderr) > 0:
@@ -96,9 +151,6 @@ if __name__ == '__main__':
     parser.add_argument('-f', help='Removes the log file if compressed and still remains in a given directory', action='store_true')
     args = parser.parse_args()
 
-    if which('pbzip2') is None:
-        raise RuntimeError(f'You need to install pbzip2 to run this script!')
-
     status = {}
     dirs = []
     if not args.d:
@@ -106,8 +158,10 @@ if __name__ == '__main__':
             dirs.append('/'.join(x for x in path.parts))
         f = compress
     else:
-        for path in Path(args.dir).rglob('log.txt.bz2'):
-            dirs.append('/'.join(x for x in path.parts))
+        # log.txt.bz2 compressed by this script, log.txt.xz, log.0003.txt.gz, ... compressed by the simulator
+        for _, suffix in LOG_COMPRESSION.values():
+            for path in Path(args.dir).rglob(f'log*.txt{suffix}'):
+                dirs.append('/'.join(x for x in path.parts))
         
         f = decompress
         
@@ -1,4 +1,4 @@
-from enum import Enum
+from enum import Enum, IntEnum
 
 CMD_SYNC = 'S'
 CMD_DISC = 'D'
@@ -9,21 +9,39 @@ CMD_DATA_COLLECTION_REPLY = 'CR'
 # Packet payload: DEV_ID # PACKET_SEQ_NR # CMD # DATA # NR_OF_RETRANSMISSIONS
 PAYLOAD = Enum('Payload', 'ID SEQ CMD DATA NR_OF_RET RSSI')
 
+class StateCode(IntEnum):
+    # device/radio states and substates are small integers, their names are used only in the log and energy report
+    ON = 0
+    OFF = 1
+    SLEEP = 2
+    NONE = 3
+    OP = 4
+    RX = 5
+    TX = 6
+    END = 7
+
+    def __str__(self):
+        return self.name
+
+    def __format__(self, format_spec):
+        return format(self.name, format_spec)
+
+
 # device/radio state
-STATE_ON = 'ON'
-STATE_OFF = 'OFF'
-STATE_SLEEP = 'SLEEP'
-STATE_SIM_END = 'END'
-SUBSTATE_NONE = 'NONE'
-SUBSTATE_SIM_END = 'END'
+STATE_ON = StateCode.ON
+STATE_OFF = StateCode.OFF
+STATE_SLEEP = StateCode.SLEEP
+STATE_SIM_END = StateCode.END
+SUBSTATE_NONE = StateCode.NONE
+SUBSTATE_SIM_END = StateCode.END
 
 # device additional substate - while ON and not IDLE
-D_SUBSTATE_OP = 'OP'
+D_SUBSTATE_OP = StateCode.OP
 
 # radio additional substate
-R_SUBSTATE_RX = 'RX'
-R_SUBSTATE_TX = 'TX'
+R_SUBSTATE_RX = StateCode.RX
+R_SUBSTATE_TX = StateCode.TX
 
-STATE = [STATE_ON, STATE_OFF, STATE_SLEEP]
-D_SUBSTATE = [SUBSTATE_NONE, D_SUBSTATE_OP]
-R_SUBSTATE = [SUBSTATE_NONE, R_SUBSTATE_RX, R_SUBSTATE_TX]
\ No newline at end of file
+STATE = frozenset([STATE_ON, STATE_OFF, STATE_SLEEP])
+D_SUBSTATE = frozenset([SUBSTATE_NONE, D_SUBSTATE_OP])
+R_SUBSTATE = frozenset([SUBSTATE_NONE, R_SUBSTATE_RX, R_SUBSTATE_TX])
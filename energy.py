@@ -1,6 +1,8 @@
 from definitions import *
+from itertools import islice
 from utils import bcolors, ROUND_N
-from state import State
+
+STATE_TYPES = ['state', 'substate', 'radio_state', 'radio_substate']
 
 class Energy:
     # DEVICE default values for Sparkfun Arthemis Nano
@@ -41,7 +43,24 @@ class Energy:
         self.logger = logger
 
 
-    def calculate_energy_usage(self, ini_state, state_table, dev_id, sim_time):
+    @staticmethod
+    def get_state_residency(start_state, start_ts, state_table, start, end_ts):
+        # time spent in each device/radio state & substate between start_ts and end_ts. start_state is the state at
+        # start_ts (codes in the order of STATE_TYPES) and the following states are the rows of the state table from
+        # the start index on
+        residency = {x: {} for x in STATE_TYPES}
+        for state_type, prev_state in zip(STATE_TYPES, start_state):
+            prev_state_ts = start_ts
+            for ts, state in zip(islice(state_table.timestamp, start, None), islice(getattr(state_table, state_type), start, None)):
+                if state == prev_state:
+                    continue
+                residency[state_type][prev_state] = residency[state_type].get(prev_state, 0) + ts - prev_state_ts
+                prev_state, prev_state_ts = StateCode(state), ts
+            residency[state_type][prev_state] = residency[state_type].get(prev_state, 0) + end_ts - prev_state_ts
+
+        return residency
+
+    def calculate_energy_usage(self, state_table, dev_id, sim_time, residency_offset=None):
         sim_duration_ms = sim_time * self.second_in_unit
         mm = []
         # duration of given device/radio state & substate
@@ -52,48 +71,51 @@ class Energy:
             'radio_substate': {SUBSTATE_NONE: 0, R_SUBSTATE_RX: 0, R_SUBSTATE_TX: 0}
         }
 
-        # keeping previous state to compare in the loop
+        # keeping previous state to compare in the loop, starting with the initial state of the device
         prev_state_ts = {'state': 0, 'substate': 0, 'radio_state': 0, 'radio_substate': 0}
-        prev_state = {'state': ini_state.state, 'substate': ini_state.substate, 'radio_state': ini_state.radio_state,
-                      'radio_substate': ini_state.radio_substate}
+        prev_state = {x: StateCode(getattr(state_table, x)[0]) for x in STATE_TYPES}
         
         # f = open(file_name, 'a')
-        def _check_and_increase_state_d(state, state_type):
+        def _check_and_increase_state_d(timestamp, state, state_type):
             # if the current state if different than the previous state
-            if prev_state[state_type] is not getattr(state, state_type):
-                state_d[state_type][prev_state[state_type]] += round(state.timestamp - prev_state_ts[state_type])
+            if prev_state[state_type] != state:
+                state_d[state_type][prev_state[state_type]] += round(timestamp - prev_state_ts[state_type])
                 if state_type.find('radio') > -1:
-                    r_a = getattr(self, f'r_{prev_state[state_type].lower()}_a')
+                    r_a = getattr(self, f'r_{prev_state[state_type].name.lower()}_a')
                     r_v = self.r_v
-                    if f'r_{prev_state[state_type].lower()}' in [R_SUBSTATE_RX, R_SUBSTATE_TX]:
+                    if f'r_{prev_state[state_type].name.lower()}' in [R_SUBSTATE_RX, R_SUBSTATE_TX]:
                         r_v = round(r_v - self.v_load_drop, 3)
-                    mm.append((prev_state_ts[state_type], state.timestamp, r_a, r_v))
+                    mm.append((prev_state_ts[state_type], timestamp, r_a, r_v))
                 else:
-                    d_a = getattr(self, f'd_{prev_state[state_type].lower()}_a')
+                    d_a = getattr(self, f'd_{prev_state[state_type].name.lower()}_a')
                     d_v = self.d_v
-                    if f'd_{prev_state[state_type].lower()}_a' in [STATE_ON, D_SUBSTATE_OP]:
+                    if f'd_{prev_state[state_type].name.lower()}_a' in [STATE_ON, D_SUBSTATE_OP]:
                         d_v = round(d_v - self.v_load_drop, 3)
                         print(d_v)
-                    mm.append((prev_state_ts[state_type], state.timestamp, d_a, d_v))
-                prev_state[state_type] = getattr(state, state_type)
-                prev_state_ts[state_type] = state.timestamp
+                    mm.append((prev_state_ts[state_type], timestamp, d_a, d_v))
+                prev_state[state_type] = StateCode(state)
+                prev_state_ts[state_type] = timestamp
 
         last_ts = 0.0
-        for ts, state in state_table.items():
-            _check_and_increase_state_d(state, 'state')
-            _check_and_increase_state_d(state, 'substate')
-            _check_and_increase_state_d(state, 'radio_state')
-            _check_and_increase_state_d(state, 'radio_substate')
+        for ts, state, substate, radio_state, radio_substate in state_table.rows():
+            _check_and_increase_state_d(ts, state, 'state')
+            _check_and_increase_state_d(ts, substate, 'substate')
+            _check_and_increase_state_d(ts, radio_state, 'radio_state')
+            _check_and_increase_state_d(ts, radio_substate, 'radio_substate')
             last_ts = ts
 
         # additional calculation for the last state
         if last_ts < sim_duration_ms:
-            state = State(dev_id, STATE_SIM_END, SUBSTATE_SIM_END, STATE_SIM_END, SUBSTATE_SIM_END)
-            state.set_timestamp(sim_duration_ms)
-            _check_and_increase_state_d(state, 'state')
-            _check_and_increase_state_d(state, 'substate')
-            _check_and_increase_state_d(state, 'radio_state')
-            _check_and_increase_state_d(state, 'radio_substate')
+            _check_and_increase_state_d(sim_duration_ms, STATE_SIM_END, 'state')
+            _check_and_increase_state_d(sim_duration_ms, SUBSTATE_SIM_END, 'substate')
+            _check_and_increase_state_d(sim_duration_ms, STATE_SIM_END, 'radio_state')
+            _check_and_increase_state_d(sim_duration_ms, SUBSTATE_SIM_END, 'radio_substate')
+
+        # state durations that are not covered by the state table, e.g. skipped steady-state cycles
+        if residency_offset is not None:
+            for state_type in residency_offset:
+                for state_state, duration in residency_offset[state_type].items():
+                    state_d[state_type][state_state] += duration
 
         energy_used = {'device': {}, 'radio': {}}
         total_energy_used = 0.0
@@ -105,13 +127,13 @@ class Energy:
                 # print(f'{state_type} {state_state}')
                 duration = state_d[state_type][state_state]
                 if state_type.find('radio') > -1:
-                    joules = float(duration) / self.second_in_unit * getattr(self, f'r_{state_state.lower()}_w')
+                    joules = float(duration) / self.second_in_unit * getattr(self, f'r_{state_state.name.lower()}_w')
                     # joules1 = joules
-                    # joules = float(duration) / self.second_in_unit * (getattr(self, f'r_{state_state.lower()}_a') * 
+                    # joules = float(duration) / self.second_in_unit * (getattr(self, f'r_{state_state.name.lower()}_a') * 
                     if state_state in [R_SUBSTATE_RX, R_SUBSTATE_TX] and self.v_load_drop > 0:
                         r_v = getattr(self, 'r_v') - self.v_load_drop
-                        r_w = getattr(self, f'r_{state_state.lower()}_a') * r_v
-                        # r_w_o = getattr(self, f'r_{state_state.lower()}_w')
+                        r_w = getattr(self, f'r_{state_state.name.lower()}_a') * r_v
+                        # r_w_o = getattr(self, f'r_{state_state.name.lower()}_w')
                         joules = float(duration) / self.second_in_unit * r_w 
                         # joules2 = joules
                         # print(f'RADIO {state_state}: {joules1} <=> {joules2} [{r_w_o} <=> {r_w}]')
@@ -122,12 +144,12 @@ class Energy:
                     total_energy_used += joules
                     continue
 
-                joules = float(duration) / self.second_in_unit * getattr(self, f'd_{state_state.lower()}_w')
+                joules = float(duration) / self.second_in_unit * getattr(self, f'd_{state_state.name.lower()}_w')
                 # joules1 = joules
                 if state_state in [STATE_ON, D_SUBSTATE_OP] and self.v_load_drop > 0:
                     d_v = getattr(self, 'd_v') - self.v_load_drop
-                    d_w = getattr(self, f'd_{state_state.lower()}_a') * d_v
-                    # d_w_o = getattr(self, f'd_{state_state.lower()}_w')
+                    d_w = getattr(self, f'd_{state_state.name.lower()}_a') * d_v
+                    # d_w_o = getattr(self, f'd_{state_state.name.lower()}_w')
                     joules = float(duration) / self.second_in_unit * d_w
                     # joules2 = joules
                     # print(f'DEVICE {state_state}: {joules1} <=> {joules2} [{d_w_o} <=> {d_w}]')
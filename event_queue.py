@@ -0,0 +1,85 @@
+import heapq
+from itertools import count
+
+
+class EventQueue:
+    # Binary heap of (timestamp, seq, event) entries. The sequence number keeps events scheduled for the same
+    # timestamp in FIFO order. Cancelled events are not removed from the heap, their entries are skipped when they
+    # reach the top (lazy cancellation).
+    def __init__(self):
+        self._heap = []
+        self._seq = count()
+        self._live = 0
+
+    def __len__(self):
+        return self._live
+
+    def push(self, event):
+        event.seq = next(self._seq)
+        event.expired = False
+        heapq.heappush(self._heap, (event.timestamp, event.seq, event))
+        self._live += 1
+
+        return event
+
+    def cancel(self, event):
+        if event.expired:
+            return
+
+        event.expired = True
+        self._live -= 1
+
+    def _is_stale(self, entry):
+        _, seq, event = entry
+        return event.expired or event.seq != seq
+
+    def _drop_stale(self):
+        while self._heap and self._is_stale(self._heap[0]):
+            heapq.heappop(self._heap)
+
+    def peek_timestamp(self):
+        self._drop_stale()
+        if not self._heap:
+            raise KeyError('peek_timestamp(): event queue is empty')
+
+        return self._heap[0][0]
+
+    def pop(self):
+        self._drop_stale()
+        if not self._heap:
+            raise KeyError('pop(): event queue is empty')
+
+        _, _, event = heapq.heappop(self._heap)
+        self.cancel(event)
+
+        return event
+
+    def pop_timestamp(self):
+        # pops all events scheduled for the earliest timestamp. Events added for the same timestamp while the
+        # returned ones are being executed end up in the next batch.
+        timestamp = self.peek_timestamp()
+        events = []
+        while self._heap and self._heap[0][0] == timestamp:
+            if self._is_stale(self._heap[0]):
+                heapq.heappop(self._heap)
+                continue
+            events.append(self.pop())
+
+        return timestamp, events
+
+    def pending(self):
+        # all pending events in the order they will be executed
+        return [x[2] for x in sorted(x for x in self._heap if not self._is_stale(x))]
+
+    def shift(self, delta):
+        # moves all pending events by delta, their order does not change
+        entries = []
+        for entry in self._heap:
+            if self._is_stale(entry):
+                continue
+            timestamp, seq, event = entry
+            event.timestamp = timestamp + delta
+            entries.append((event.timestamp, seq, event))
+
+        heapq.heapify(entries)
+        self._heap = entries
@@ -0,0 +1,232 @@
+import argparse
+import mmap
+import os
+import struct
+from definitions import *
+from utils import format_ms
+
+# Binary trace of the simulation. Every record has the same size:
+# timestamp, kind, flags, dev_id, a, b, value
+# The meaning of a, b, value and flags depends on the kind of the record. Payloads of received packets do not fit
+# into a record, they are appended to a separate payloads file and the rx records point into it.
+TRACE_MAGIC = b'LLTR'
+TRACE_VERSION = 4
+TRACE_HEADER = struct.Struct('<4sHH')
+TRACE_RECORD = struct.Struct('<qBBIqqf')
+TRACE_BATCH_SIZE = 4096
+
+TRACE_DEVICE_STATE = 0
+TRACE_RADIO_STATE = 1
+TRACE_TX = 2
+TRACE_RX = 3
+TRACE_DROP = 4
+TRACE_DRIFT = 5
+
+# reasons of dropped packets, stored in flags
+DROP_SENSITIVITY = 0
+DROP_DEVICE_OFF = 1
+DROP_RADIO_OFF = 2
+DROP_RADIO_NOT_RX = 3
+DROP_OUT_OF_RANGE = 4
+
+# state codes, both for states and substates
+TRACE_STATES = [STATE_ON, STATE_OFF, STATE_SLEEP, SUBSTATE_NONE, D_SUBSTATE_OP, R_SUBSTATE_RX, R_SUBSTATE_TX, STATE_SIM_END]
+TRACE_STATE_CODES = {x: i for i, x in enumerate(TRACE_STATES)}
+
+
+def get_payloads_path(file_path):
+    return f'{os.path.splitext(file_path)[0]}.payloads'
+
+
+class TraceWriter:
+    # records are packed into a buffer and written to the file in batches
+    def __init__(self, file_path, second_in_unit):
+        self._file = open(file_path, 'wb')
+        self._file.write(TRACE_HEADER.pack(TRACE_MAGIC, TRACE_VERSION, second_in_unit))
+        self._buffer = bytearray()
+        self._count = 0
+        self._payloads = open(get_payloads_path(file_path), 'wb')
+        self._payloads_buffer = bytearray()
+        self._payloads_size = 0
+        # a packet is shared by all its receivers, so its payload is stored only once
+        self._last_packet = None
+        self._last_offset = 0
+
+    def _add(self, timestamp, kind, flags, dev_id, a=0, b=0, value=0.0):
+        self._buffer += TRACE_RECORD.pack(timestamp, kind, flags, dev_id, a, b, value)
+        self._count += 1
+        if self._count >= TRACE_BATCH_SIZE:
+            self.flush()
+
+    @staticmethod
+    def _pack_state(state, substate):
+        return TRACE_STATE_CODES[state] << 8 | TRACE_STATE_CODES[substate]
+
+    def state(self, timestamp, dev_id, radio, old_state, old_substate, state, substate, substate_changed):
+        kind = TRACE_RADIO_STATE if radio else TRACE_DEVICE_STATE
+        self._add(
+            timestamp, kind, int(substate_changed), dev_id,
+            self._pack_state(old_state, old_substate), self._pack_state(state, substate)
+        )
+
+    def tx(self, timestamp, dev_id, seq, size):
+        self._add(timestamp, TRACE_TX, 0, dev_id, seq, size)
+
+    def rx(self, timestamp, dev_id, packet, rx_dbm, gateway=False):
+        if packet is not self._last_packet:
+            self._last_packet = packet
+            self._last_offset = self._payloads_size
+            self._payloads_buffer += packet.payload.encode('utf8')
+            self._payloads_size += packet.size
+
+        self._add(timestamp, TRACE_RX, int(gateway), dev_id, self._last_offset, packet.size, rx_dbm)
+
+    def drop(self, timestamp, dev_id, reason, sensitivity=0, rx_dbm=0.0):
+        # sensitivity is the ID of the sender for DROP_OUT_OF_RANGE
+        self._add(timestamp, TRACE_DROP, reason, dev_id, sensitivity, 0, rx_dbm)
+
+    def drift(self, timestamp, dev_id, local_ts, global_ts):
+        self._add(timestamp, TRACE_DRIFT, 0, dev_id, local_ts, global_ts)
+
+    def flush(self):
+        # payloads go first, so every flushed rx record points into the flushed part of the payloads file
+        if self._payloads_buffer:
+            self._payloads.write(self._payloads_buffer)
+            self._payloads_buffer = bytearray()
+        if self._buffer:
+            self._file.write(self._buffer)
+            self._buffer = bytearray()
+            self._count = 0
+
+    def close(self):
+        self.flush()
+        self._payloads.close()
+        self._file.close()
+
+
+def _unpack_state(code):
+    return TRACE_STATES[code >> 8], TRACE_STATES[code & 0xff]
+
+
+def render(record, second_in_unit=1000, payloads=b''):
+    # renders a record the same way as the text log does (without colours), payloads is the content of the payloads
+    # file of the trace
+    timestamp, kind, flags, dev_id, a, b, value = record
+    if kind in [TRACE_DEVICE_STATE, TRACE_RADIO_STATE]:
+        name = 'radio' if kind == TRACE_RADIO_STATE else 'device'
+        old_state, old_substate = _unpack_state(a)
+        state, substate = _unpack_state(b)
+        if flags:
+            msg = f'dev_{dev_id} {name} state: {old_state} => {state}, substate: {old_substate} => {substate}'
+        else:
+            msg = f'dev_{dev_id} {name} state: {old_state} => {state}, substate: {substate}'
+    elif kind == TRACE_TX:
+        msg = f'dev_{dev_id} is sending packet with seq_nr {a}...'
+    elif kind == TRACE_RX:
+        receiver = 'GW' if flags else 'dev'
+        payload = bytes(payloads[a:a + b]).decode('utf8')
+        msg = f'Packet received by {receiver}_{dev_id}: {payload} with RSSI: {round(value, 2)} dBm'
+    elif kind == TRACE_DROP:
+        if flags == DROP_SENSITIVITY:
+            msg = f'Packet dropped by dev_{dev_id}. Packet rx_dbm {round(value, 2)} dBm is below receiver sensitivity {a} dBm.'
+        elif flags == DROP_DEVICE_OFF:
+            msg = f'Device dev_{dev_id} is either OFF or SLEEPING. Dropping packet'
+        elif flags == DROP_RADIO_OFF:
+            msg = f'Device dev_{dev_id} radio is either OFF or in sleep state. Dropping packet'
+        elif flags == DROP_OUT_OF_RANGE:
+            msg = f'Packet dropped by dev_{dev_id}. dev_{a} is out of range.'
+        else:
+            msg = f'Device dev_{dev_id} radio is not in RX substate. Dropping packet'
+    elif kind == TRACE_DRIFT:
+        drift = b - a
+        drift_direction = '' if drift < 0 else '+'
+        msg = f'[dev_{dev_id}][{drift_direction}{drift}ms][{format_ms(a, second_in_unit)} -> {format_ms(b, second_in_unit)}]'
+    else:
+        raise RuntimeError(f'Unknown trace record: {kind}')
+
+    return f'{int((timestamp - timestamp % second_in_unit) / second_in_unit):10,}.{timestamp % second_in_unit:03d}s\t{msg}'
+
+
+def _find_first(mm, count, start):
+    # records are written in the order of their timestamps, so the first record of a time window can be found with
+    # a binary search
+    lo, hi = 0, count
+    while lo < hi:
+        mid = (lo + hi) // 2
+        timestamp = struct.unpack_from('<q', mm, TRACE_HEADER.size + mid * TRACE_RECORD.size)[0]
+        if timestamp < start:
+            lo = mid + 1
+        else:
+            hi = mid
+
+    return lo
+
+
+def read_second_in_unit(file_path):
+    with open(file_path, 'rb') as f:
+        magic, version, second_in_unit = TRACE_HEADER.unpack(f.read(TRACE_HEADER.size))
+
+    if magic != TRACE_MAGIC or version != TRACE_VERSION:
+        raise RuntimeError(f'{file_path} is not a trace file of version {TRACE_VERSION}!')
+
+    return second_in_unit
+
+
+def read_payloads(file_path):
+    with open(get_payloads_path(file_path), 'rb') as f:
+        return f.read()
+
+
+def read_trace(file_path, devices=None, kinds=None, start=None, end=None):
+    # yields records matching the given devices, kinds and <start, end> window
+    read_second_in_unit(file_path)
+    with open(file_path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            count = (len(mm) - TRACE_HEADER.size) // TRACE_RECORD.size
+            first = 0 if start is None else _find_first(mm, count, start)
+            for batch_start in range(first, count, TRACE_BATCH_SIZE):
+                batch_end = min(batch_start + TRACE_BATCH_SIZE, count)
+                batch = mm[TRACE_HEADER.size + batch_start * TRACE_RECORD.size:TRACE_HEADER.size + batch_end * TRACE_RECORD.size]
+                for record in TRACE_RECORD.iter_unpack(batch):
+                    if end is not None and record[0] > end:
+                        return
+                    if devices is not None and record[3] not in devices:
+                        continue
+                    if kinds is not None and record[1] not in kinds:
+                        continue
+                    yield record
+
+
+if __name__ == '__main__':
+    kinds = {
+        'device': TRACE_DEVICE_STATE,
+        'radio': TRACE_RADIO_STATE,
+        'tx': TRACE_TX,
+        'rx': TRACE_RX,
+        'drop': TRACE_DROP,
+        'drift': TRACE_DRIFT
+    }
+    parser = argparse.ArgumentParser('Decodes a binary trace written by the simulator')
+    parser.add_argument('trace', help='Trace file, e.g. data/<dir>/trace.bin')
+    parser.add_argument('-d', help='Device IDs', type=int, nargs='+')
+    parser.add_argument('-k', help='Record kinds', choices=list(kinds), nargs='+')
+    parser.add_argument('-s', help='Start of the time window in seconds', type=float, default=None)
+    parser.add_argument('-e', help='End of the time window in seconds', type=float, default=None)
+    parser.add_argument('-c', help='Only count the matching records', action='store_true')
+    args = parser.parse_args()
+
+    siu = read_second_in_unit(args.trace)
+    records = read_trace(
+        args.trace,
+        devices=set(args.d) if args.d else None,
+        kinds=set(kinds[x] for x in args.k) if args.k else None,
+        start=None if args.s is None else int(args.s * siu),
+        end=None if args.e is None else int(args.e * siu)
+    )
+
+    if args.c:
+        print(sum(1 for _ in records))
+    else:
+        payloads = read_payloads(args.trace)
+        for record in records:
+            print(render(record, siu, payloads))
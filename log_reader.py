@@ -0,0 +1,157 @@
+import argparse
+import json
+import mmap
+import os
+from bisect import bisect_left
+from collections import deque
+from logger import LOG_INDEX_ENTRY, LOG_COMPRESSION, get_log_index_path, get_log_segments_path
+
+
+def parse_timestamp(line):
+    # lines written by the logger start with the simulation time, e.g. '    86,400.000s\t...'. Lines of multi-line
+    # messages and the dumped log context ('|     86,400.000s\t...') do not have it
+    head = line.split(b's\t', 1)[0].strip().replace(b',', b'')
+    try:
+        seconds, ms = head.split(b'.')
+        return int(seconds) * 1000 + int(ms)
+    except ValueError:
+        return None
+
+
+def get_log_files(file_path):
+    # files of the log in the order of the simulation time. A compressed or segmented log is listed in log.index.json
+    # next to log.txt, the files of segments that were not kept are skipped
+    segments_path = get_log_segments_path(file_path)
+    if not os.path.isfile(segments_path):
+        return [file_path]
+
+    with open(segments_path, 'r') as f:
+        index = json.load(f)
+
+    directory = os.path.dirname(file_path)
+    files = [os.path.join(directory, x['file']) for x in index['segments']]
+    return [x for x in files if os.path.isfile(x)]
+
+
+def _get_opener(file_path):
+    # the decompressor of a log compressed by the simulator, None for uncompressed logs
+    for opener, suffix in LOG_COMPRESSION.values():
+        if file_path.endswith(suffix):
+            return opener
+
+    return None
+
+
+def _read_lines(f):
+    # lines of a compressed log. The last block of a log that is still being written can be incomplete
+    try:
+        for line in f:
+            yield line.rstrip(b'\n')
+    except EOFError:
+        return
+
+
+def read_index(file_path):
+    # (simulation time, byte offset) entries of an uncompressed log file, empty if the log has no index
+    index_path = get_log_index_path(file_path)
+    if not os.path.isfile(index_path):
+        return []
+
+    with open(index_path, 'rb') as f:
+        data = f.read()
+
+    # the last entry can be incomplete while the simulation is running
+    data = data[:len(data) - len(data) % LOG_INDEX_ENTRY.size]
+    return list(LOG_INDEX_ENTRY.iter_unpack(data))
+
+
+def _find_offset(file_path, start):
+    # offset of the last indexed line before start, the lines in between have to be scanned
+    index = read_index(file_path)
+    i = bisect_left([x[0] for x in index], start) - 1
+    if i < 0:
+        return 0
+
+    return index[i][1]
+
+
+def _mmap_lines(mm, pos):
+    while pos < len(mm):
+        line_end = mm.find(b'\n', pos)
+        if line_end < 0:
+            line_end = len(mm)
+        yield mm[pos:line_end]
+        pos = line_end + 1
+
+
+def _window(lines, start, end):
+    inside = start is None
+    for line in lines:
+        t = parse_timestamp(line)
+        if t is not None:
+            if end is not None and t > end:
+                return
+            inside = start is None or t >= start
+        if inside:
+            yield line.decode('utf8')
+
+
+def read_window(file_path, start=None, end=None):
+    # yields lines of the log within <start, end> (in ms of simulation time)
+    opener = _get_opener(file_path)
+    if opener is not None:
+        # compressed logs have no index and are read from the beginning
+        with opener(file_path, 'rb') as f:
+            yield from _window(_read_lines(f), start, end)
+        return
+
+    offset = 0 if start is None else _find_offset(file_path, start)
+    with open(file_path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            yield from _window(_mmap_lines(mm, offset), start, end)
+
+
+def tail(file_path, n=1):
+    # last n lines of the log without reading the whole file (compressed logs have to be decompressed up to the end)
+    opener = _get_opener(file_path)
+    if opener is not None:
+        with opener(file_path, 'rb') as f:
+            return [x.decode('utf8') for x in deque(_read_lines(f), maxlen=n)]
+
+    with open(file_path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return []
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            lines = []
+            end = len(mm)
+            if mm[end - 1:end] == b'\n':
+                end -= 1
+            while len(lines) < n and end >= 0:
+                start = mm.rfind(b'\n', 0, end) + 1
+                lines.append(mm[start:end].decode('utf8'))
+                end = start - 1
+
+    return lines[::-1]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser('Reads a time window or the end of a log file')
+    parser.add_argument('log', help='Log file, e.g. data/<dir>/log.txt, data/<dir>/log.0003.txt.bz2')
+    parser.add_argument('-s', help='Start of the time window in seconds', type=float, default=None)
+    parser.add_argument('-e', help='End of the time window in seconds', type=float, default=None)
+    parser.add_argument('-t', help='Print the last N lines', type=int, default=None)
+    args = parser.parse_args()
+
+    if args.t is not None:
+        lines = tail(args.log, args.t)
+    else:
+        lines = read_window(
+            args.log,
+            start=None if args.s is None else int(args.s * 1000),
+            end=None if args.e is None else int(args.e * 1000)
+        )
+
+    for line in lines:
+        print(line)
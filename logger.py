@@ -1,4 +1,15 @@
 import logging
+import atexit
+import bz2
+import gzip
+import json
+import lzma
+import os
+import struct
+import sys
+import threading
+from collections import deque
+from queue import Queue
 from utils import ROUND_N
 from sortedcontainers import SortedDict
 
@@ -8,93 +19,421 @@ WARNING = logging.WARNING
 ERROR = logging.ERROR
 CRITICAL = logging.CRITICAL
 ONLY_ALWAYS = 100
+LOG_LEVELS = {
+    'debug': DEBUG,
+    'info': INFO,
+    'warning': WARNING,
+    'error': ERROR,
+    'critical': CRITICAL,
+    'always': ONLY_ALWAYS
+}
+
+# log categories, records without a category are never filtered out by the category filter
+CAT_PROPAGATION = 'propagation'
+CAT_STATE = 'state'
+CAT_DRIFT = 'drift'
+CAT_SCHEDULE = 'schedule'
+LOG_CATEGORIES = [CAT_PROPAGATION, CAT_STATE, CAT_DRIFT, CAT_SCHEDULE]
+
+# number of log lines collected before they are handed over to the writer thread
+LOG_CHUNK_LINES = 4096
+# number of chunks waiting for the writer thread, the simulation waits when the writer (or the compressor) falls behind
+LOG_QUEUE_CHUNKS = 16
+
+# streaming compressors for the log file and the suffixes of the compressed files
+LOG_COMPRESSION = {
+    'bz2': (bz2.open, '.bz2'),
+    'lzma': (lzma.open, '.xz'),
+    'gzip': (gzip.open, '.gz')
+}
+
+# prefix of the records written by Logger.dump_context()
+LOG_CONTEXT_PREFIX = '| '
+
+# sidecar index of an uncompressed log file: (simulation time, byte offset) of the first line at or after every
+# indexed interval
+LOG_INDEX_ENTRY = struct.Struct('<qq')
+
+def get_log_index_path(file_path):
+    return f'{os.path.splitext(file_path)[0]}.idx'
+
+def get_log_segments_path(file_path):
+    # list of the files of a compressed or segmented log, next to log.txt
+    return f'{os.path.splitext(file_path)[0]}.index.json'
 
 class FakeLogger:
-    def debug(self, t, msg):
+    def is_enabled_for(self, level, category=None, dev_id=None):
+        return True
+
+    def debug(self, t, msg, *args, category=None, dev_id=None):
+        if args:
+            msg = msg % args
         new_entry = f'{int((t - t % 1000) / 1000):10,}.{t % 1000:03d}s\t{msg}'
         print(new_entry)
 
+class LogWriter:
+    # writes chunks of log lines to a file from a background thread, so the simulation does not wait for the disk (or
+    # the compressor)
+    def __init__(self, file_path, compression=None, indexed=False):
+        if compression is not None and compression not in LOG_COMPRESSION:
+            raise RuntimeError('Unknown log compression: {}'.format(compression))
+        self._compression = compression
+        self._indexed = indexed
+        self._index = None
+        self._open(file_path)
+        self._queue = Queue(maxsize=LOG_QUEUE_CHUNKS)
+        self._error = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _open(self, file_path):
+        # lines are encoded here, so the writer knows the byte offset of every line
+        if self._compression is None:
+            self._file = open(file_path, 'wb')
+        else:
+            self._file = LOG_COMPRESSION[self._compression][0](file_path, 'wb')
+        self._offset = 0
+
+        if self._indexed:
+            self._index = open(get_log_index_path(file_path), 'wb')
+
+    def _close(self):
+        self._file.close()
+        if self._index is not None:
+            self._index.close()
+
+    def _run(self):
+        try:
+            self._write_items()
+        except Exception as e:
+            # reported by the next write() or close(). The queue is emptied so the simulation is not blocked by it
+            self._error = e
+            while self._queue.get() is not None:
+                pass
+
+    def _write_items(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            # a path starts a new segment, the files of segments that are not kept any more are removed
+            if isinstance(item[0], str):
+                file_path, removed = item
+                self._close()
+                self._open(file_path)
+                for x in removed:
+                    for path in [x, get_log_index_path(x)]:
+                        if os.path.isfile(path):
+                            os.remove(path)
+                continue
+            lines, marks = item
+            if marks:
+                # marks are (line number in the chunk, timestamp of the line). Lines are encoded one by one, so their
+                # byte lengths give the offsets of the marked lines
+                encoded = [f'{x}\n'.encode('utf8') for x in lines]
+                entries = bytearray()
+                offset = self._offset
+                previous = 0
+                for nr, t in marks:
+                    offset += sum(map(len, encoded[previous:nr]))
+                    previous = nr
+                    entries += LOG_INDEX_ENTRY.pack(t, offset)
+                self._index.write(entries)
+                data = b''.join(encoded)
+            else:
+                data = ''.join(f'{x}\n' for x in lines).encode('utf8')
+            self._file.write(data)
+            self._offset += len(data)
+
+        self._close()
+
+    def _check_error(self):
+        if self._error is not None:
+            raise RuntimeError('Writing the log file failed: {}'.format(self._error)) from self._error
+
+    def write(self, lines, marks=None):
+        self._check_error()
+        self._queue.put((lines, marks))
+
+    def rotate(self, file_path, removed=()):
+        self._check_error()
+        self._queue.put((file_path, removed))
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+        self._check_error()
+
 class Logger:
-    def __init__(self, log_level=DEBUG, forced=False):
-        if log_level not in [DEBUG, INFO, WARNING, ERROR, CRITICAL, ONLY_ALWAYS]:
-            raise RuntimeError('Unknown log level: {}'.format(log_level))
-        self._log_level = log_level
+    def __init__(self, log_level=DEBUG, forced=False, echo=True):
+        self.set_level(log_level)
+        self._categories = None
+        self._devices = None
         self._log = SortedDict()
+        self._deferred = SortedDict()
         self._previous_ts = 0
         self._last_ts = 0
         self._sim_time = 0
-        self._file = None
+        self._writer = None
+        self._buffer = []
+        self._marks = []
+        self._index_ms = 0
+        self._index_next = None
+        self._file_path = None
+        self._compression = None
+        self._segment_ms = 0
+        self._segment_end = None
+        self._segment_keep = 0
+        self._segments = []
+        self._echo = echo
         self._forced = forced
+        self._context = None
+        self._context_level = DEBUG
         # logging.basicConfig(level=log_level)
 
-    def set_file(self, file_path):
-        self._file = open(file_path, 'w')
+    def set_level(self, log_level):
+        if log_level not in [DEBUG, INFO, WARNING, ERROR, CRITICAL, ONLY_ALWAYS]:
+            raise RuntimeError('Unknown log level: {}'.format(log_level))
+        self._log_level = log_level
+
+    def set_filters(self, categories=None, devices=None):
+        # only records of the given categories / devices are logged, None or an empty list disables the filter
+        for category in categories or []:
+            if category not in LOG_CATEGORIES:
+                raise RuntimeError('Unknown log category: {}'.format(category))
+
+        self._categories = set(categories) if categories else None
+        self._devices = set(devices) if devices else None
+
+    def set_echo(self, echo):
+        # print the log to stdout as well
+        self._echo = echo
+
+    def set_file(self, file_path, compression=None, segment_ms=0, index_ms=0, segment_keep=0):
+        # the log can be compressed on the fly and split into segments of segment_ms simulation time. A compressed or
+        # segmented log is listed in an index file next to it (log.index.json). With segment_keep > 0 only the last
+        # segment_keep segments are kept on the disk. Uncompressed log files get a sidecar index with the byte offset
+        # of every index_ms of simulation time, see log_reader.py
+        self.close_file()
+        self._file_path = file_path
+        self._compression = compression
+        self._segment_ms = segment_ms
+        self._segment_keep = segment_keep
+        self._segments = []
+        self._segment_end = None
+        if segment_ms > 0:
+            self._segment_end = segment_ms
+        indexed = compression is None and index_ms > 0
+        self._index_ms = index_ms if indexed else 0
+        self._index_next = 0 if indexed else None
+        self._writer = LogWriter(self._get_segment_path(0), compression, indexed)
+        self._add_segment(0)
+        atexit.register(self.close_file)
 
     def close_file(self):
-        if self._file is not None:
-            self._file.close()
+        if self._writer is not None:
+            try:
+                self._write_buffer()
+            finally:
+                writer, self._writer = self._writer, None
+                self._index_next = None
+                writer.close()
+
+    def _get_segment_path(self, nr):
+        file_path = self._file_path
+        if self._segment_ms > 0:
+            root, ext = os.path.splitext(file_path)
+            file_path = f'{root}.{nr:04d}{ext}'
+
+        if self._compression is not None:
+            file_path += LOG_COMPRESSION[self._compression][1]
 
-    def debug(self, t, msg):
-        if self._log_level <= DEBUG:
-            self._print(t, msg)
+        return file_path
+
+    def _add_segment(self, nr):
+        # returns paths of the segments that are not kept any more
+        self._segments.append({'file': os.path.basename(self._get_segment_path(nr)), 'start_ms': nr * self._segment_ms})
+        removed = []
+        if self._segment_keep > 0 and len(self._segments) > self._segment_keep:
+            directory = os.path.dirname(self._file_path)
+            removed = [os.path.join(directory, x['file']) for x in self._segments[:-self._segment_keep]]
+            self._segments = self._segments[-self._segment_keep:]
+
+        if self._segment_ms == 0 and self._compression is None:
+            return removed
+
+        index = {'compression': self._compression, 'segment_ms': self._segment_ms, 'segments': self._segments}
+        with open(get_log_segments_path(self._file_path), 'w') as outfile:
+            outfile.write(json.dumps(index, indent=4))
+
+        return removed
+
+    def _rotate(self, t):
+        # empty segments (e.g. skipped by fast-forwarding) are not created
+        self._write_buffer()
+        nr = t // self._segment_ms
+        self._segment_end = (nr + 1) * self._segment_ms
+        self._writer.rotate(self._get_segment_path(nr), self._add_segment(nr))
+        # every segment has its own index starting with its first line
+        if self._index_next is not None:
+            self._index_next = t
+
+    def set_context(self, size, level=DEBUG):
+        # keeps the last size records filtered out by the log level (but not below the given level) in memory. They
+        # are written to the log only by dump_context(), e.g. when the simulation fails
+        self._context = deque(maxlen=size) if size > 0 else None
+        self._context_level = level
+
+    def _is_captured(self, level):
+        return self._context is not None and self._context_level <= level
+
+    def is_enabled_for(self, level, category=None, dev_id=None):
+        # lets callers skip building expensive messages that would be filtered out anyway
+        if self._log_level > level and not self._is_captured(level):
+            return False
+
+        return self._passes_filters(category, dev_id)
+
+    def _passes_filters(self, category, dev_id):
+        if category is not None and self._categories is not None and category not in self._categories:
+            return False
+
+        if dev_id is not None and self._devices is not None and dev_id not in self._devices:
+            return False
+
+        return True
+
+    # msg can be a %-style template, like in the logging module. It is formatted with args only if the record passes
+    # the log level and the category / device filters
+    def debug(self, t, msg, *args, category=None, dev_id=None):
+        self._log_record(DEBUG, t, msg, args, category, dev_id)
         # logging.debug(msg)
 
-    def info(self, t, msg):
-        if self._log_level <= INFO:
-            self._print(t, msg)
+    def info(self, t, msg, *args, category=None, dev_id=None):
+        self._log_record(INFO, t, msg, args, category, dev_id)
         # logging.info(msg)
 
-    def warning(self, t, msg):
-        if self._log_level <= WARNING:
-            self._print(t, msg)
+    def warning(self, t, msg, *args, category=None, dev_id=None):
+        self._log_record(WARNING, t, msg, args, category, dev_id)
         # logging.warning(msg)
 
-    def error(self, t, msg):
-        if self._log_level <= ERROR:
-            self._print(t, msg)
+    def error(self, t, msg, *args, category=None, dev_id=None):
+        self._log_record(ERROR, t, msg, args, category, dev_id)
         # logging.error(msg)
 
-    def critical(self, t, msg):
-        if self._log_level <= CRITICAL:
-            self._print(t, msg)
+    def critical(self, t, msg, *args, category=None, dev_id=None):
+        self._log_record(CRITICAL, t, msg, args, category, dev_id)
         # logging.critical(msg)
 
-    def always(self, t, msg):
-        self._print(t, msg)
+    def _log_record(self, level, t, msg, args, category, dev_id):
+        if not self.is_enabled_for(level, category, dev_id):
+            return
+
+        if self._log_level > level:
+            # formatted only if the context is dumped
+            self._context.append((t, msg, args))
+            return
+
+        self._print(t, msg % args if args else msg)
+
+    def always(self, t, msg, *args):
+        # results of the simulation, affected neither by the log level nor by the category / device filters
+        self._print(t, msg % args if args else msg)
+
+    def defer(self, t, level, msg, *args, category=None, dev_id=None):
+        # log record for a future timestamp. It is kept aside until the log reaches t, records filtered out by the
+        # log level or the filters are dropped right away
+        if not self.is_enabled_for(level, category, dev_id):
+            return
+
+        if self._log_level > level:
+            self._context.append((t, msg, args))
+            return
+
+        if t not in self._deferred:
+            self._deferred[t] = []
+
+        self._deferred[t].append(msg % args if args else msg)
+
+    def _release_deferred(self, t):
+        while self._deferred and self._deferred.peekitem(0)[0] <= t:
+            ts, msgs = self._deferred.popitem(0)
+            if ts not in self._log:
+                self._log[ts] = []
+
+            for msg in msgs:
+                self._log[ts].append(self._format(ts, msg))
+
+    def dump_context(self, t, reason):
+        # writes the captured records right after everything logged so far, as a block between two lines logged at t.
+        # The records are older than the lines before the block, so they are prefixed with LOG_CONTEXT_PREFIX and
+        # their timestamps are not read by log_reader.py (nor indexed)
+        if not self._context:
+            return
+
+        records = sorted(self._context, key=lambda x: x[0])
+        self._context.clear()
+        self._release_deferred(t)
+        self._emit()
+        lines = [self._format(t, f'{reason} Last {len(records)} filtered out log records:')]
+        lines.extend(LOG_CONTEXT_PREFIX + self._format(x, msg % args if args else msg) for x, msg, args in records)
+        lines.append(self._format(t, 'End of the filtered out log records.'))
+        self._echo_lines(lines)
+        if self._writer is not None:
+            self._buffer.extend(lines)
 
     def set_sim_time(self, sim_time):
         self._sim_time = sim_time
 
     def _flush(self):
-        # log_list = list(self._log)
-        # log_list.sort()
+        self._emit()
+        self._write_buffer()
 
+    def _emit(self):
+        # moves the sorted entries to the file buffer and stdout
+        lines = []
         for x in self._log:
-            for y in self._log[x]:
-                if self._file is not None:
-                    self._file.write(f'{y}\n')
-                print(y)       
-        
+            # the summary at the end of the simulation stays in the last segment
+            if self._segment_end is not None and self._segment_end <= x < self._sim_time and self._writer is not None:
+                self._buffer.extend(lines)
+                self._echo_lines(lines)
+                lines = []
+                self._rotate(x)
+            if self._index_next is not None and x >= self._index_next:
+                self._marks.append((len(self._buffer) + len(lines), x))
+                self._index_next = (x // self._index_ms + 1) * self._index_ms
+            lines.extend(self._log[x])
         self._log.clear()
 
+        self._echo_lines(lines)
+        if self._writer is not None:
+            self._buffer.extend(lines)
+            if len(self._buffer) >= LOG_CHUNK_LINES:
+                self._write_buffer()
+
+    def _echo_lines(self, lines):
+        if self._echo and lines:
+            sys.stdout.write(''.join(f'{x}\n' for x in lines))
+
+    def _write_buffer(self):
+        if self._writer is not None and self._buffer:
+            self._writer.write(self._buffer, self._marks)
+            self._buffer = []
+            self._marks = []
+
+    @staticmethod
+    def _format(t, msg):
+        return f'{int((t - t % 1000) / 1000):10,}.{t % 1000:03d}s\t{msg}'
+
     def _print(self, t, msg):
-        new_entry = f'{int((t - t % 1000) / 1000):10,}.{t % 1000:03d}s\t{msg}'
+        self._release_deferred(t)
+        new_entry = self._format(t, msg)
         if t not in self._log:
             self._log[t] = []
 
         self._log[t].append(new_entry)
         
         if t - self._last_ts >= 10000 or t == self._sim_time or self._forced:
-            # log_list = list(self._log)
-            # log_list.sort()
-
-            for x in self._log:
-                for y in self._log[x]:
-                    if self._file is not None:
-                        self._file.write(f'{y}\n')
-                    print(y)
-                        
-            
-            self._log.clear()
+            self._emit()
 
         self._last_ts = t
@@ -1,11 +1,24 @@
 import math
 import numpy as np
+from itertools import product
 
-DISTANCE_TABLE = []
+NEIGHBOUR_TABLE = []
 MIN_DISTANCE = 50
+# distances are computed for blocks of devices of at most this many pairs, so the memory stays bounded even when all
+# devices are in a single cell
+NEIGHBOUR_BLOCK_PAIRS = 1 << 20
 
 def get_distance(dev1, dev2):
-    return DISTANCE_TABLE[dev1.id][dev2.id]
+    # devices out of range are not in the neighbour table
+    distance = NEIGHBOUR_TABLE[dev1.id].get(dev2.id)
+    if distance is None:
+        return round(calculate_distance(dev1, dev2), 2)
+
+    return distance
+
+def get_neighbours(dev):
+    # {device ID: distance} of devices in range, ordered by device IDs
+    return NEIGHBOUR_TABLE[dev.id]
 
 def calculate_distance_simple(xy1, xy2):
     return math.sqrt(sum([(o2 - o1) ** 2 for o2, o1 in zip(xy1, xy2)]))
@@ -15,30 +28,48 @@ def calculate_distance(dev1, dev2):
     return math.sqrt(sum([(o2 - o1) ** 2 for o2, o1 in zip(dev1.position, dev2.position)]))
 
 
-def calculate_distance_matrix(end_devices):
-    global DISTANCE_TABLE
+def calculate_neighbour_table(end_devices, max_distance=math.inf):
+    # devices are put into a uniform grid with cells of max_distance, so neighbours of a device can be only in the
+    # cells around its own one. Only pairs within max_distance are stored.
+    global NEIGHBOUR_TABLE
     if len(end_devices) <= 1:
         raise RuntimeError('You need to have at least two units to run the simulation!')
 
-    DISTANCE_TABLE = np.zeros((len(end_devices), len(end_devices)))
-
-    # for i in range(0, len(end_devices)):
-    #     DISTANCE_TABLE.append(i)
-    #     DISTANCE_TABLE[i] = []
-
-    for dev1 in end_devices:
-        # DISTANCE_TABLE.append([])
-        for dev2 in end_devices:
-            if dev1 != dev2:
-                dist = round(calculate_distance(dev1, dev2), 2)
-                # print('[{}] Distance to [{}] is: {}m'.format(dev1.position, dev2.position, dist))
-                # DISTANCE_TABLE[dev1.id].append(dist)
-                DISTANCE_TABLE[dev1.id][dev2.id] = dist
-            else:
-                # DISTANCE_TABLE[dev1.id].append(0)
-                DISTANCE_TABLE[dev1.id][dev1.id] = 0
-
-    return
+    positions = np.zeros((len(end_devices), len(end_devices[0].position)))
+    for dev in end_devices:
+        positions[dev.id] = dev.position
+
+    cells = np.zeros(positions.shape, dtype=int)
+    if max_distance < math.inf:
+        cells = np.floor(positions / max_distance).astype(int)
+
+    grid = {}
+    for dev_id, cell in enumerate(map(tuple, cells.tolist())):
+        if cell not in grid:
+            grid[cell] = []
+        grid[cell].append(dev_id)
+
+    offsets = list(product([-1, 0, 1], repeat=positions.shape[1]))
+    NEIGHBOUR_TABLE = [{} for _ in range(len(end_devices))]
+    for cell, members in grid.items():
+        candidates = []
+        for offset in offsets:
+            candidates.extend(grid.get(tuple(c + o for c, o in zip(cell, offset)), []))
+        candidates = np.unique(candidates)
+        candidate_positions = positions[candidates]
+
+        block_size = max(NEIGHBOUR_BLOCK_PAIRS // len(candidates), 1)
+        for start in range(0, len(members), block_size):
+            block = members[start:start + block_size]
+            distances = np.zeros((len(block), len(candidates)))
+            for axis in range(positions.shape[1]):
+                distances += (positions[block, axis][:, np.newaxis] - candidate_positions[:, axis][np.newaxis, :]) ** 2
+            distances = np.round(np.sqrt(distances), 2)
+            for row, dev_id in enumerate(block):
+                in_range = (distances[row] <= max_distance) & (candidates != dev_id)
+                NEIGHBOUR_TABLE[dev_id] = dict(zip(candidates[in_range].tolist(), distances[row][in_range].tolist()))
+
+    return NEIGHBOUR_TABLE
 
 
 def generate_coordinates(xc, yc, radius, nr_of_devs, coordinates_set = None, min_dist=50):
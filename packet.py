@@ -0,0 +1,93 @@
+class Packet:
+    # A transmitted packet. It is created once per transmission and shared by all its receivers, so it can not be
+    # modified. The rx power differs per receiver and is passed along with the packet instead.
+    __slots__ = ('payload', 'size', 'fields', 'sender')
+
+    def __init__(self, payload):
+        object.__setattr__(self, 'payload', payload)
+        object.__setattr__(self, 'size', len(payload.encode('utf8')))
+        # LoRaLitE payloads are '#' separated fields starting with the ID of the sender, LoRaWAN payloads do not
+        # carry it
+        fields = tuple(payload.split('#'))
+        object.__setattr__(self, 'fields', fields)
+        object.__setattr__(self, 'sender', int(fields[0]) if fields[0].isdigit() else -1)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('Packet can not be modified')
+
+    def __eq__(self, other):
+        return isinstance(other, Packet) and self.payload == other.payload
+
+    def __hash__(self):
+        return hash(self.payload)
+
+    def __repr__(self):
+        return f'Packet({self.payload!r})'
+
+
+class IdRanges:
+    # IDs of the devices addressed by a DISC / DC command as inclusive ranges, '1:40,41:80' on the wire. Membership
+    # and the slot of an ID (its position in the expanded list) are computed from the ranges, the IDs are never
+    # expanded.
+    __slots__ = ('ranges', '_size')
+
+    def __init__(self, ranges):
+        self.ranges = tuple(ranges)
+        self._size = sum(end - start + 1 for start, end in self.ranges)
+
+    @classmethod
+    def parse(cls, id_string):
+        ranges = []
+        for part in id_string.split(','):
+            bounds = [int(x) for x in part.split(':')]
+            ranges.append((bounds[0], bounds[-1]))
+
+        return cls(ranges)
+
+    @classmethod
+    def from_ids(cls, ids):
+        # a new range starts when an ID is lower than the start of the current one, i.e. when a rotated list of
+        # consecutive IDs wraps around
+        ranges = []
+        for x in ids:
+            if ranges and x >= ranges[-1][0]:
+                ranges[-1][1] = x
+            else:
+                ranges.append([x, x])
+
+        return cls(tuple(x) for x in ranges)
+
+    def __len__(self):
+        return self._size
+
+    def __contains__(self, dev_id):
+        for start, end in self.ranges:
+            if start <= dev_id <= end:
+                return True
+
+        return False
+
+    def __iter__(self):
+        for start, end in self.ranges:
+            yield from range(start, end + 1)
+
+    def index(self, dev_id):
+        offset = 0
+        for start, end in self.ranges:
+            if start <= dev_id <= end:
+                return offset + dev_id - start
+            offset += end - start + 1
+
+        raise ValueError(f'{dev_id} is not in {self}')
+
+    def __eq__(self, other):
+        return isinstance(other, IdRanges) and self.ranges == other.ranges
+
+    def __hash__(self):
+        return hash(self.ranges)
+
+    def __str__(self):
+        return ','.join(f'{start}:{end}' if end != start else f'{start}' for start, end in self.ranges)
+
+    def __repr__(self):
+        return f'IdRanges({str(self)!r})'
@@ -1,12 +1,10 @@
 import time
-import subprocess
-import select
 import os
 import argparse
-import shlex
 import json
 import math
 from pathlib import Path
+from log_reader import tail, get_log_files
 from utils import bcolors, natural_keys
 
 
@@ -30,23 +28,15 @@ def printProgressBar (iteration, total, prefix = '', suffix = '', decimals = 1,
 
 
 def readStatus(filename, sim_seconds, nr, total_count):
-    args = shlex.split(f'tail -n 2 {filename}')
-
-    f = subprocess.Popen(args, stdout=subprocess.PIPE,stderr=subprocess.PIPE)
-    p = select.poll()
-    p.register(f.stdout)
-
-    last_line = None
-    if p.poll(100):
-        last_line = f.stdout.readline()
-        # time.sleep(1)
+    last_lines = tail(filename, 2)
+    last_line = last_lines[0] if last_lines else ''
 
     is_stats_file = True if filename.find('stats.txt') >= 0 else False
 
     finished = False
     failed = False
     interrupted = False
-    last_line = last_line.decode('utf8').replace('\n', '').replace('\r', '')
+    last_line = last_line.replace('\r', '')
     if last_line.find('Execution time') >= 0:
         finished = True
 
@@ -76,7 +66,7 @@ def readStatus(filename, sim_seconds, nr, total_count):
         eta = -1
         timestamp = int(time.time())
         percent = round(100 * (int(last_line) / float(sim_seconds)), 1)
-        status_filename = filename.replace('log.txt', 'status.json')
+        status_filename = os.path.join(os.path.dirname(filename), 'status.json')
         if not os.path.isfile(status_filename):
             status = {'t': timestamp, 'p': percent}
             with open(status_filename, 'w') as outfile:
@@ -122,7 +112,9 @@ if __name__ == '__main__':
             config = json.load(f)
         sim_time = config['general']['sim_duration_s']
 
-        log_file = file_name.replace('config.json', 'log.txt')
+        # the progress is read from the latest segment of a segmented and / or compressed log
+        log_files = get_log_files(file_name.replace('config.json', 'log.txt'))
+        log_file = log_files[-1] if log_files else file_name.replace('config.json', 'log.txt')
         log_path = Path(log_file)
         stats_file = file_name.replace('config.json', 'stats.txt')
         stats_path = Path(stats_file)
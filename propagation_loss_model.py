@@ -1,39 +1,150 @@
 import math
+import numpy as np
 from mobility import get_distance
-from numpy import random
+
+# number of shadowing samples drawn at once for a link
+SHADOWING_BLOCK_SIZE = 256
+# shadowing is limited to +/- this quantile of its normal distribution, so the range of the devices stays bounded
+SHADOWING_QUANTILE = 3.0
+
+class ShadowingEngine:
+    # sample n of a link is taken from block n // block_size, whose generator is seeded by (seed, a, b, block), so the
+    # samples of a link do not depend on the other links, on the order of the transmissions or on which of them were
+    # evaluated. Samples are clipped to +/- limit
+    def __init__(self, sigma, seed=None, block_size=SHADOWING_BLOCK_SIZE, limit=math.inf):
+        self.sigma = sigma
+        self.limit = limit
+        self.seed = np.random.SeedSequence(seed).entropy
+        self._block_size = block_size
+        self._links = {}
+
+    def get(self, a, b, n):
+        block, i = divmod(n, self._block_size)
+        link = self._links.get((a, b))
+        if link is None or link[0] != block:
+            samples = np.random.default_rng([self.seed, a, b, block]).normal(0.0, self.sigma, self._block_size)
+            link = [block, np.clip(samples, -self.limit, self.limit).tolist()]
+            self._links[(a, b)] = link
+
+        return link[1][i]
 
 class LogDistancePropagationLossModel:
 
-    def __init__(self, exponent, ref_distance, ref_loss, sigma=0.0):
+    def __init__(self, exponent, ref_distance, ref_loss, sigma=0.0, quantile=SHADOWING_QUANTILE):
         self.exponent = exponent
         self.ref_distance = ref_distance
         self.ref_loss = ref_loss
         self.sigma = sigma
+        self.quantile = quantile
+        self._shadowing = ShadowingEngine(sigma, limit=quantile * sigma) if sigma > 0 else None
+        self._links = None
+        self._rxc = None
+        self._rxc_list = None
+        self._rx_dbm_tables = {}
+
+    def set_shadowing(self, seed, quantile=SHADOWING_QUANTILE):
+        if quantile <= 0:
+            raise RuntimeError(f'Quantile of the shadowing has to be above 0, not {quantile}!')
+
+        self.quantile = quantile
+        if self.sigma > 0:
+            self._shadowing = ShadowingEngine(self.sigma, seed, limit=quantile * self.sigma)
+
+    def get_shadowing_seed(self):
+        return None if self._shadowing is None else self._shadowing.seed
+
+    def calculate_rxc(self, distances):
+        # attenuation of all given links in one pass, without the random shadowing
+        distances = np.asarray(distances, dtype=float)
+        rxc = np.full(distances.shape, -float(self.ref_loss))
+        far = distances > self.ref_distance
+        rxc[far] = -self.ref_loss - 10 * self.exponent * np.log10(distances[far] / self.ref_distance)
+
+        return rxc
+
+    def set_neighbour_table(self, neighbour_table):
+        # without the random shadowing the attenuation of a link never changes, so it is computed only once for all
+        # links of the neighbour table. Links are stored in a flat list, _links maps (a, b) to their position
+        self._rx_dbm_tables = {}
+        self._links = None
+        self._rxc = None
+        self._rxc_list = None
+        if self.sigma > 0:
+            return
+
+        self._links = []
+        distances = []
+        for neighbours in neighbour_table:
+            self._links.append({x: len(distances) + i for i, x in enumerate(neighbours)})
+            distances.extend(neighbours.values())
+        self._rxc = self.calculate_rxc(distances)
+        self._rxc_list = self._rxc.tolist()
+
+    def get_rx_dbm_table(self, tx_power_dbm):
+        if tx_power_dbm not in self._rx_dbm_tables:
+            self._rx_dbm_tables[tx_power_dbm] = np.round(tx_power_dbm + self._rxc, 2).tolist()
+
+        return self._rx_dbm_tables[tx_power_dbm]
 
     def calculate_rx_power(self, lou_a, lou_b, tx_power_dbm):
+        # returns rx power and the attenuation coefficient of the link for the current transmission of lou_a
+        if self._links is not None:
+            i = self._links[lou_a.id].get(lou_b.id)
+            if i is not None:
+                return self.get_rx_dbm_table(tx_power_dbm)[i], self._rxc_list[i]
+
         distance = get_distance(lou_a, lou_b)
         if distance <= self.ref_distance:
-            return tx_power_dbm - self.ref_loss
+            return round(tx_power_dbm - self.ref_loss, 2), -self.ref_loss
+
+        path_loss_db = 10 * self.exponent * math.log10(distance / self.ref_distance)
+        if self._shadowing is not None:
+            path_loss_db += self._shadowing.get(lou_a.id, lou_b.id, lou_a.packets_sent)
+        rxc = -self.ref_loss - path_loss_db
+
+        return round(tx_power_dbm + rxc, 2), rxc
 
-        path_loss_db = 10 * self.exponent * math.log10(distance / self.ref_distance) + random.normal(0.0, self.sigma)
+    def _calculate_rx_power(self, distance, tx_power_dbm, margin=0.0):
+        path_loss_db = 10 * self.exponent * math.log10(distance / self.ref_distance) - margin
         rxc = -self.ref_loss - path_loss_db
 
-        log = 'distance={}m, reference-attenuation={}db, attenuation coefficient={}db'.format(
-            distance, -self.ref_loss, rxc
-        )
+        return round(tx_power_dbm + rxc, 2)
+
+    def _estimate_max_steps(self, tx_power_dbm, max_sensitivity, margin):
+        # inverted log-distance model: the rx power rounded to 0.01 dBm is not above the sensitivity from here on
+        budget = tx_power_dbm - self.ref_loss - max_sensitivity + margin - 0.005
+        distance = self.ref_distance * np.power(10.0, np.divide(budget, 10 * self.exponent))
+
+        return np.maximum(np.ceil(distance - self.ref_distance), 1)
+
+    def calculate_max_distance(self, tx_power_dbm, max_sensitivity, quantile=0.0):
+        # first whole metre after the reference distance at which the rx power is not above the sensitivity. quantile
+        # of the random shadowing (e.g. 1.645 for 95%) is added to the link budget as a margin
+        margin = quantile * self.sigma
+        steps = int(self._estimate_max_steps(tx_power_dbm, max_sensitivity, margin))
+        # the estimate can be off by a metre because of the rounding
+        while steps > 1 and self._calculate_rx_power(self.ref_distance + steps - 1, tx_power_dbm, margin) <= max_sensitivity:
+            steps -= 1
+        while self._calculate_rx_power(self.ref_distance + steps, tx_power_dbm, margin) > max_sensitivity:
+            steps += 1
 
-        return round(tx_power_dbm + rxc, 2), log
+        return self.ref_distance + steps
 
-    def calculate_max_distance(self, tx_power_dbm, max_sensitivity):
-        distance, sensitivity = [self.ref_distance, 0]
-        while sensitivity > max_sensitivity:
-            distance += 1
-            if distance <= self.ref_distance:
-                return tx_power_dbm - self.ref_loss
+    def calculate_max_distances(self, tx_power_dbm, max_sensitivity, quantile=0.0):
+        # calculate_max_distance for whole tables, e.g. tx powers x sensitivities of all SFs x quantiles. Arguments
+        # are broadcast against each other
+        tx_power_dbm = np.asarray(tx_power_dbm, dtype=float)
+        max_sensitivity = np.asarray(max_sensitivity, dtype=float)
+        margin = np.asarray(quantile, dtype=float) * self.sigma
+        steps = self._estimate_max_steps(tx_power_dbm, max_sensitivity, margin)
 
-            path_loss_db = 10 * self.exponent * math.log10(distance / self.ref_distance) + random.normal(0.0, self.sigma)
-            rxc = -self.ref_loss - path_loss_db
-            sensitivity = round(tx_power_dbm + rxc, 2)
+        def _rx_power(steps):
+            path_loss_db = 10 * self.exponent * np.log10((self.ref_distance + steps) / self.ref_distance) - margin
+            return np.round(tx_power_dbm - self.ref_loss - path_loss_db, 2)
 
-        return distance
+        for _ in range(2):
+            steps = np.where((steps > 1) & (_rx_power(steps - 1) <= max_sensitivity), steps - 1, steps)
+        for _ in range(2):
+            steps = np.where(_rx_power(steps) > max_sensitivity, steps + 1, steps)
 
+        return self.ref_distance + steps
@@ -1,14 +1,15 @@
 import math
 from exceptions import SimException
 from definitions import *
-from random import choice, shuffle
+from random import shuffle
 from itertools import cycle
-from string import ascii_uppercase
+from utils import PayloadFactory
 
 
 class Scheduler:
-    def __init__(self, config, tx_params, rx_sensitivity, subbands, toa):
+    def __init__(self, config, tx_params, rx_sensitivity, subbands, toa, payloads=None):
         self.config = config
+        self.payloads = PayloadFactory() if payloads is None else payloads
         self.tx_params = tx_params
         self.toa = toa
         self.rx_sensitivity = rx_sensitivity
@@ -17,12 +18,24 @@ class Scheduler:
     def set_config(self, config):
         self.config = config
 
+    def _get_disc_reply_size(self, number_of_devices):
+        # size of the longest DISC reply
+        return len(f'{number_of_devices + 1}#{self.config["general"]["max_packet_nr"]}#{CMD_DISC_REPLY}#{self.rx_sensitivity}.00#0'.encode('utf8'))
+
+    def _get_toa_ms(self, number_of_devices):
+        # time on air of a DC packet and of the longest DISC reply rounded up to whole units, from the tables of ToA
+        second_in_unit = self.config['general']['second_in_unit']
+        return (
+            self.toa.get_time_on_air_ms(self.config['lora']['payload_size'], second_in_unit),
+            self.toa.get_time_on_air_ms(self._get_disc_reply_size(number_of_devices), second_in_unit)
+        )
+
     def generate_schedule_for_wcm(self, sim_seconds, number_of_devices):
         nr_of_cmd = math.floor((sim_seconds - self.config['wcm']['first_op_at_s']) / self.config['wcm']['send_interval_s'])
         # print(nr_of_cmd)
         # print('####')
         toa_dc_ms = self.toa.get_time_on_air(self.tx_params['max_payload']) * self.config['general']['second_in_unit']
-        toa_disc_ms = self.toa.get_time_on_air(len(f'{number_of_devices + 1}#{self.config["general"]["max_packet_nr"]}#{CMD_DISC_REPLY}#{self.rx_sensitivity}.00#0'.encode('utf8'))) * self.config['general']['second_in_unit']
+        toa_disc_ms = self.toa.get_time_on_air(self._get_disc_reply_size(number_of_devices)) * self.config['general']['second_in_unit']
         packets_per_disc_window = math.floor(self.config['wcm']['disc_window_s'] * 1000 / (toa_disc_ms + self.config['wcl']['reply_gt_ms'] + self.config['radio']['mode_change_ms']))
         packets_per_dc_window =  math.floor(self.config['wcm']['dc_window_s'] * 1000 / (toa_dc_ms + self.config['wcl']['reply_gt_ms'] + self.config['radio']['mode_change_ms']))
 
@@ -126,8 +139,7 @@ class Scheduler:
 
 
     def get_recommended_dw_dcw(self, sim_seconds, number_of_devices):
-        toa_dc_ms = math.ceil(self.toa.get_time_on_air(self.config['lora']['payload_size']) * self.config['general']['second_in_unit'])
-        toa_disc_ms = math.ceil(self.toa.get_time_on_air(len(f'{number_of_devices + 1}#{self.config["general"]["max_packet_nr"]}#{CMD_DISC_REPLY}#{self.rx_sensitivity}.00#0'.encode('utf8'))) * self.config['general']['second_in_unit'])
+        toa_dc_ms, toa_disc_ms = self._get_toa_ms(number_of_devices)
 
         rec_dcw = math.ceil((toa_dc_ms + self.config['wcl']['reply_gt_ms'] + self.config['radio']['mode_change_ms']) * (number_of_devices + 1) / self.config['general']['second_in_unit'])
         rec_dw = math.ceil((toa_disc_ms + self.config['wcl']['reply_gt_ms'] + self.config['radio']['mode_change_ms']) * (number_of_devices + 1) / self.config['general']['second_in_unit'])
@@ -157,7 +169,7 @@ class Scheduler:
         if bytes_to_send > 0:
             days = int(sim_seconds / 86400)
             toa_dc_ms = self.toa.get_time_on_air(self.config['lora']['payload_size']) * self.config['general']['second_in_unit']
-            toa_disc_ms = self.toa.get_time_on_air(len(f'{number_of_devices + 1}#{self.config["general"]["max_packet_nr"]}#{CMD_DISC_REPLY}#{self.rx_sensitivity}.00#0'.encode('utf8'))) * self.config['general']['second_in_unit']
+            toa_disc_ms = self.toa.get_time_on_air(self._get_disc_reply_size(number_of_devices)) * self.config['general']['second_in_unit']
 
             # rec_dcw = math.ceil((toa_dc_ms + self.config['wcl']['reply_gt_ms'] + self.config['radio']['mode_change_ms']) * (number_of_devices - 1) / self.config['general']['second_in_unit'])
             # rec_dw = math.ceil((toa_disc_ms + self.config['wcl']['reply_gt_ms'] + self.config['radio']['mode_change_ms']) * (number_of_devices - 1) / self.config['general']['second_in_unit'])
@@ -194,8 +206,7 @@ class Scheduler:
 
     def generate_schedule_for_wcm_data(self, dev, sim_seconds, number_of_devices, bytes_to_send, balance_energy=True):
         days = int(sim_seconds / 86400)
-        toa_dc_ms = math.ceil(self.toa.get_time_on_air(self.config['lora']['payload_size']) * self.config['general']['second_in_unit'])
-        toa_disc_ms = math.ceil(self.toa.get_time_on_air(len(f'{number_of_devices + 1}#{self.config["general"]["max_packet_nr"]}#{CMD_DISC_REPLY}#{self.rx_sensitivity}.00#0'.encode('utf8'))) * self.config['general']['second_in_unit'])
+        toa_dc_ms, toa_disc_ms = self._get_toa_ms(number_of_devices)
         rec_dcw = math.ceil((toa_dc_ms + self.config['wcl']['reply_gt_ms'] + self.config['radio']['mode_change_ms']) * (number_of_devices + 1) / self.config['general']['second_in_unit'])
         rec_dw = math.ceil((toa_disc_ms + self.config['wcl']['reply_gt_ms'] + self.config['radio']['mode_change_ms']) * (number_of_devices + 1) / self.config['general']['second_in_unit'])
         
@@ -412,8 +423,7 @@ class Scheduler:
     def generate_schedule_for_wcm_data_fix(self, sim_seconds, number_of_devices, bytes_to_send, balance_energy=True):
         days = int(sim_seconds / 86400)
         days = days if days > 0 else 1
-        toa_dc_ms = math.ceil(self.toa.get_time_on_air(self.config['lora']['payload_size']) * self.config['general']['second_in_unit'])
-        toa_disc_ms = math.ceil(self.toa.get_time_on_air(len(f'{number_of_devices + 1}#{self.config["general"]["max_packet_nr"]}#{CMD_DISC_REPLY}#{self.rx_sensitivity}.00#0'.encode('utf8'))) * self.config['general']['second_in_unit'])
+        toa_dc_ms, toa_disc_ms = self._get_toa_ms(number_of_devices)
         rec_dcw = math.ceil((toa_dc_ms + self.config['wcl']['reply_gt_ms'] + self.config['radio']['mode_change_ms']) * (number_of_devices + 1) / self.config['general']['second_in_unit'])
         rec_dw = math.ceil((toa_disc_ms + self.config['wcl']['reply_gt_ms'] + self.config['radio']['mode_change_ms']) * (number_of_devices + 1) / self.config['general']['second_in_unit'])
         c_dcw = self.config['wcm']['dc_window_s'] 
@@ -721,8 +731,7 @@ class Scheduler:
     def generate_schedule_for_wcm_data_simple(self, sim_seconds, number_of_devices, bytes_to_send, balance_energy=True):
         days = int(sim_seconds / 86400)
         days = days if days > 0 else 1
-        toa_dc_ms = math.ceil(self.toa.get_time_on_air(self.config['lora']['payload_size']) * self.config['general']['second_in_unit'])
-        toa_disc_ms = math.ceil(self.toa.get_time_on_air(len(f'{number_of_devices + 1}#{self.config["general"]["max_packet_nr"]}#{CMD_DISC_REPLY}#{self.rx_sensitivity}.00#0'.encode('utf8'))) * self.config['general']['second_in_unit'])
+        toa_dc_ms, toa_disc_ms = self._get_toa_ms(number_of_devices)
         rec_dcw = math.ceil((toa_dc_ms + self.config['wcl']['reply_gt_ms'] + self.config['radio']['mode_change_ms']) * (number_of_devices + 1) / self.config['general']['second_in_unit'])
         rec_dw = math.ceil((toa_disc_ms + self.config['wcl']['reply_gt_ms'] + self.config['radio']['mode_change_ms']) * (number_of_devices + 1) / self.config['general']['second_in_unit'])
         c_dcw = self.config['wcm']['dc_window_s'] 
@@ -873,7 +882,7 @@ class Scheduler:
     def generate_schedule_for_lwan(self, dev, sim_seconds, number_of_devices, bytes_to_send):
         schedule = {}
         
-        payload = ''.join(choice(ascii_uppercase) for i in range(self.config['lora']['payload_size']))
+        payload = self.payloads.get(self.config['lora']['payload_size'])
         if bytes_to_send > 0:
             paktes_count = math.ceil(bytes_to_send / self.config['lora']['payload_size'])
             toa_s = self.toa.get_time_on_air(self.config['lora']['payload_size'])
@@ -905,7 +914,7 @@ class Scheduler:
 
             if bytes_to_send > 0 and total_bytes > bytes_to_send:
                 diff = total_bytes - bytes_to_send
-                tmp_payload = ''.join(choice(ascii_uppercase) for i in range(self.config['lora']['payload_size'] - diff))
+                tmp_payload = self.payloads.get(self.config['lora']['payload_size'] - diff)
 
             info = f'[{i:3}]: {delay_s} | {payload:15}'
             if self.config['general']['save_schedule_to_file']:
@@ -1,26 +1,28 @@
 from ctypes import util
 import math
-from logger import ONLY_ALWAYS, Logger, INFO, DEBUG, CRITICAL
+from logger import ONLY_ALWAYS, Logger, INFO, DEBUG, CRITICAL, LOG_LEVELS, LOG_CATEGORIES, LOG_COMPRESSION, CAT_PROPAGATION, CAT_STATE, CAT_DRIFT, CAT_SCHEDULE
 from propagation_loss_model import LogDistancePropagationLossModel
 from propagation_delay_model import ConstantSpeedPropagationDelayModel
-from mobility import calculate_distance_matrix, get_distance, generate_coordinates, plot_coordinates, calculate_distance_simple
-from copy import deepcopy
-from utils import ROUND_N, bcolors, format_ms, get_random_true_false
+from mobility import calculate_neighbour_table, get_distance, get_neighbours, generate_coordinates, plot_coordinates, calculate_distance_simple
+from bisect import bisect_right
+from utils import ROUND_N, bcolors, get_random_true_false, PayloadFactory, LazyMs, LazyArgs
 from toa import ToA
 from energy import Energy
 from schedule import Scheduler
-from state import State
+from state import State, StateTable
 from functools import reduce
 import json
 import argparse
 from enum import Enum
-from random import choice
-from string import ascii_uppercase
 from datetime import datetime
-from sortedcontainers import SortedList, SortedDict
+from sortedcontainers import SortedList
+from event_queue import EventQueue
 import traceback
 import sys
 from exceptions import SimException, ClockDriftException
+from packet import Packet, IdRanges
+from clock import Clock, CLOCK_DRIFT_DISTRIBUTION
+from event_trace import TraceWriter, DROP_SENSITIVITY, DROP_DEVICE_OFF, DROP_RADIO_OFF, DROP_RADIO_NOT_RX, DROP_OUT_OF_RANGE
 from definitions import *
 from typing import List
 
@@ -29,27 +31,6 @@ from typing import List
 logger = Logger(log_level=INFO, forced=False)
 config = {}
 DIR_PATH = ''
-CDPPM_SEARCH_RANGE = 1000000
-PPM = 1000000
-
-# device/radio state
-STATE_ON = 'ON'
-STATE_OFF = 'OFF'
-STATE_SLEEP = 'SLEEP'
-STATE_SIM_END = 'END'
-SUBSTATE_NONE = 'NONE'
-SUBSTATE_SIM_END = 'END'
-
-# device additional substate - while ON and not IDLE
-D_SUBSTATE_OP = 'OP'
-
-# radio additional substate
-R_SUBSTATE_RX = 'RX'
-R_SUBSTATE_TX = 'TX'
-
-STATE = [STATE_ON, STATE_OFF, STATE_SLEEP]
-D_SUBSTATE = [SUBSTATE_NONE, D_SUBSTATE_OP]
-R_SUBSTATE = [SUBSTATE_NONE, R_SUBSTATE_RX, R_SUBSTATE_TX]
 
 DEV_ARTHEMIS_NANO = 'arthemis_nano'
 RAD_SX1276 = 'sx1276'
@@ -120,6 +101,10 @@ TX_PARAMS = {
 }
 
 LIST_OF_DEVICES = []
+# IDs of devices with the radio listening (ON, RX substate)
+RECEIVERS = set()
+# IDs of the parents, the only receivers of packets sent by children
+PARENTS = []
 GW = None
 
 # PROPAGATION_MODEL = LogDistancePropagationLossModel(4.12, 1, 7.7)
@@ -127,44 +112,66 @@ GW = None
 PROPAGATION_MODEL = LogDistancePropagationLossModel(2.9, 5, 55.75)
 DELAY_MODEL = ConstantSpeedPropagationDelayModel()
 TOA = ToA(TX_PARAMS['sf'], TX_PARAMS['bw'], TX_PARAMS['preamble'], TX_PARAMS['cr'], TX_PARAMS['ldro'], TX_PARAMS['crc'], TX_PARAMS['hd'], logger)
+PAYLOADS = PayloadFactory()
 
 SIM_TIME = 0
 SIU = 0 # Second In Unit
-EVENT_LIST = SortedDict()
+EVENT_LIST = EventQueue()
+CYCLE_SKIPPER = None
+TRACE = None
 commandline = ''
 
 def get_time_on_air(pkt_size):
     return TOA.get_time_on_air(pkt_size, SIM_TIME)
 
-def add_event(dev_id, timestamp, f, *args, **kwargs):
+def get_time_on_air_ms(pkt_size):
+    return TOA.get_time_on_air_ms(pkt_size, SIU, SIM_TIME)
+
+def add_event(dev_id, timestamp, f, *args):
     global EVENT_LIST
     if timestamp >= config['general']['sim_duration_ms']:
-        return
-    
-    if timestamp not in EVENT_LIST:
-        EVENT_LIST[timestamp] = []
+        return None
+
+    return EVENT_LIST.push(EventUnit(dev_id, timestamp, EventUnit.get_opcode(f), args))
 
-    event = EventUnit(dev_id, timestamp, f, *args, **kwargs)
-    EVENT_LIST[timestamp].append(event)
 
+# opcode -> function executed by an event. Events keep only the opcode of a method of the device they belong to
+# instead of a bound method, the table is filled on the first use of a given method.
+EVENT_FUNCTIONS = []
+EVENT_OPCODES = {}
 
 class EventUnit:
-    def __init__(self, dev_id, timestamp, f, *args, **kwargs):
+    __slots__ = ('dev_id', 'timestamp', 'seq', 'opcode', 'args', 'expired')
+
+    def __init__(self, dev_id, timestamp, opcode, args):
         self.dev_id = dev_id
         self.timestamp = timestamp
-        self.func = f
-        self.func_name = f.__name__
+        self.seq = -1
+        self.opcode = opcode
         self.args = args
-        self.kwargs = kwargs
         self.expired = False
 
+    @staticmethod
+    def get_opcode(f):
+        func = f.__func__
+        if func not in EVENT_OPCODES:
+            EVENT_OPCODES[func] = len(EVENT_FUNCTIONS)
+            EVENT_FUNCTIONS.append(func)
+
+        return EVENT_OPCODES[func]
+
+    @property
+    def func_name(self):
+        return EVENT_FUNCTIONS[self.opcode].__name__
+
     def execute(self):
         global SIM_TIME, LIST_OF_DEVICES
         SIM_TIME = self.timestamp
-        LIST_OF_DEVICES[self.dev_id].timestamp = SIM_TIME
-        LIST_OF_DEVICES[self.dev_id].current_event_timestamp = SIM_TIME
-        self.func(*self.args, **self.kwargs)
-        LIST_OF_DEVICES[self.dev_id].previous_event_timestamp = SIM_TIME
+        dev = LIST_OF_DEVICES[self.dev_id]
+        dev.timestamp = SIM_TIME
+        dev.current_event_timestamp = SIM_TIME
+        EVENT_FUNCTIONS[self.opcode](dev, *self.args)
+        dev.previous_event_timestamp = SIM_TIME
 
 
 class LoraBand:
@@ -176,12 +183,24 @@ class LoraBand:
         self.sf = sf
 
 class Device:
+    __slots__ = (
+        'id', 'type', 'position', 'state', 'state_table', 'lora_band', 'packets_sent',
+        'packets_received', 'sent_pkt_seq', 'last_pkt_rec_at', 'received_pkt_payload', 'sent_pkt_payload', 'bytes_sent',
+        'bytes_received', 'dc_bytes_sent', 'next_transmission_time', 'transmission_allowed_at', 'receive_buff',
+        'event_list', 'receive_events', 'timestamp', 'clock', 'detect_preamble_ms', 'tranmission_interval',
+        'current_event_timestamp', 'previous_event_timestamp', 'last_event_timestamp', 'rx_active', 'rx_active_at',
+        'skipped_residency', 'config', 'receive_window', 'recv_count', 'expected_recv_count',
+        'total_expected_recv_count'
+    )
+    # counters advanced by the number of skipped cycles when the simulation is fast-forwarded
+    CYCLE_COUNTERS = ('packets_sent', 'packets_received', 'bytes_sent', 'bytes_received', 'sent_pkt_seq')
+
     def __init__(self, nr, position, type):
         self.id = nr
         self.type = type
         self.position = position
         self.state: State = State(self.id)
-        self.state_table = {}
+        self.state_table = StateTable()
         self.lora_band = LoraBand(TX_PARAMS['band'], TX_PARAMS['sf'])
         self.packets_sent = 0
         self.packets_received = 0
@@ -197,19 +216,16 @@ class Device:
         self.event_list = SortedList()
         self.receive_events = SortedList()
         self.timestamp = 0
-        self.cd_negative = get_random_true_false()
-        self.clock_drift = config['general']['cdppm']
-        self.clock_drift_total = 0
-        self.clock_drift_timestamp_modifier = config['general']['cdppm'] - 1 + 3 * 60 * 1000 #3 minutes later
-        self.clock_drift_modified_at = 0
+        self.clock = Clock(0, get_random_true_false())
+        if config['general']['perform_clock_drift']:
+            self.clock.ppm = Clock.draw_ppm(config['general']['cdppm'], config['general']['cdppm_distribution'])
         self.detect_preamble_ms = math.ceil(TOA.get_symbols_time() * SIU) #5 symbols required to detect the preamble
         self.tranmission_interval = 0
-        self.sbs_active = False
         self.current_event_timestamp = 0
         self.last_event_timestamp = 0
         self.rx_active = False
+        self.skipped_residency = {}
 
-        self.initial_state = deepcopy(self.state)
         self.config = {
             'switch_on_duration': config['device']['sch_on_duration_ms'],    # how long in s it takes to turn on device
             'switch_off_duration': config['device']['sch_off_duration_ms']   # how long in s it takes to turn off device
@@ -218,177 +234,178 @@ class Device:
         # saving initial Device state
         self._save_state()
         # scheduling an event at timestamp 0 that will print basic information about the Device
-        add_event(self.id, 0, self._info)
-        
-        # # perform clock drift if specified in the simulation parameters
-        # if config['general']['cdppm'] > 0:
-        #     if self.type == DEV_TYPE.PARENT:
-        #         add_event(self.id, self.clock_drift_timestamp_modifier + config['wcm']['first_op_at_s'] * SIU, self._perform_clock_drift)
-        #     elif self.type == DEV_TYPE.CHILD:
-        #         add_event(self.id, self.clock_drift_timestamp_modifier + config['wcl']['first_op_at_s'] * SIU, self._perform_clock_drift)
-
-    def _perform_clock_drift(self):
-        global CDPPM_SEARCH_RANGE
-
-        CDPPM_SEARCH_RANGE = self.tranmission_interval
-        # search_range_start = self.timestamp + config['general']['cdppm']
-        search_range_start = self.timestamp + 1
-        search_range_end = self.timestamp + config['general']['cdppm'] + CDPPM_SEARCH_RANGE
-        
-        # if self.tranmission_interval < 1000000:
-        #     self.clock_drift_timestamp_modifier = math.ceil(self.tranmission_interval / 2)
-
-        # no clock drift if device is already awake
-        if self.state.state == STATE_ON:
-            next_clock_drift = self.timestamp + self.clock_drift_timestamp_modifier
-            logger.info(self.timestamp, f'{bcolors.LIGHT_GRAY}[dev_{self.id}] is ON. Clock drift moved to {format_ms(next_clock_drift, SIU)}{bcolors.ENDC}')
-            add_event(self.id, next_clock_drift, self._perform_clock_drift)
-            log_drift_issue(self.id, self.timestamp)
-            return
+        self._add_event(0, self._info)
 
-        drift_direction = ''
-        drift_sign = 1
-        clock_drift = 0
-        
-        if self.cd_negative:
-            drift_sign = -1
-        else:
-            drift_direction = '+'
-
-
-        event_list_slice = EVENT_LIST.irange(search_range_start, search_range_end)
-        logger.info(self.timestamp, f'{bcolors.LIGHT_GRAY}[dev_{self.id}] Clock drift search range: {format_ms(search_range_start, SIU)} --> {format_ms(search_range_end, SIU)}{bcolors.ENDC}')
-        tmp_event_list = SortedDict()
-        event_list_index = {}
-        last_modified_timestamp = 0
-        for timestamp in event_list_slice:
-            time_to_next_event = timestamp - self.previous_event_timestamp
-            clock_drift = math.ceil(time_to_next_event * self.clock_drift / PPM) * drift_sign
-            last_modified_timestamp = timestamp
-            for event in EVENT_LIST[timestamp]:
-                drifted_timestamp = timestamp + clock_drift
-                if event.dev_id == self.id:
-                    if drifted_timestamp not in tmp_event_list:
-                        tmp_event_list[drifted_timestamp] = []
-                    event.timestamp = drifted_timestamp
-                    logger.info(self.timestamp, f'{bcolors.LIGHT_GRAY}[dev_{self.id}][{drift_direction}{clock_drift}ms][{format_ms(timestamp, SIU)} -> {format_ms(drifted_timestamp, SIU)}]: event({event.func_name}, [{event.args}][{event.kwargs}]){bcolors.ENDC}')
-                    tmp_event_list[drifted_timestamp].append(event)
-                    if timestamp not in event_list_index:
-                        event_list_index[timestamp] = []
-                    event_list_index[timestamp].append(EVENT_LIST[timestamp].index(event))
-            
-        for timestamp in event_list_index:
-            event_list: List = EVENT_LIST.pop(timestamp)
-            event_to_remain = []
-            for event in event_list:
-                if event_list.index(event) not in event_list_index[timestamp]:
-                    event_to_remain.append(event)
-            
-            if len(event_to_remain) > 0:
-                EVENT_LIST[timestamp] = event_to_remain
+    def _add_event(self, timestamp, f, *args):
+        # timestamp is a deadline measured by the local clock of the device, it is converted to the simulation time
+        # once, here, so scheduled events never have to be moved because of the clock drift
+        drifted_timestamp = self.clock.to_global(self.timestamp, timestamp)
+        if drifted_timestamp != timestamp and TRACE is not None:
+            TRACE.drift(self.timestamp, self.id, timestamp, drifted_timestamp)
+
+        if drifted_timestamp != timestamp:
+            logger.info(
+                self.timestamp, bcolors.LIGHT_GRAY + '[dev_%s][%s%sms][%s -> %s]: event(%s, [%s])' + bcolors.ENDC,
+                self.id, '' if drifted_timestamp < timestamp else '+', drifted_timestamp - timestamp, LazyMs(timestamp, SIU),
+                LazyMs(drifted_timestamp, SIU), f.__name__, LazyArgs(args), category=CAT_DRIFT, dev_id=self.id
+            )
+
+        return add_event(self.id, drifted_timestamp, f, *args)
 
-        for timestamp in tmp_event_list:
-            if timestamp not in EVENT_LIST:
-                EVENT_LIST[timestamp] = []
+    def _get_cycle_state(self, now):
+        # everything that decides about the future behaviour of the device, timestamps are relative to now
+        return (
+            self.state.state, self.state.substate, self.state.radio_state, self.state.radio_substate,
+            self.rx_active, len(self.receive_buff),
+            max(self.next_transmission_time - now, 0), max(self.transmission_allowed_at - now, 0)
+        )
+
+    def _get_cycle_counters(self):
+        return [getattr(self, x) for x in self.CYCLE_COUNTERS]
 
-            for event in tmp_event_list[timestamp]:
-                EVENT_LIST[timestamp].append(event)
+    def _skip_cycles(self, nr_of_cycles, delta, counters_diff):
+        for counter, diff in zip(self.CYCLE_COUNTERS, counters_diff):
+            setattr(self, counter, getattr(self, counter) + nr_of_cycles * diff)
 
-        self.clock_drift_total += clock_drift
-        # last_modified_timestamp = last_modified_timestamp if last_modified_timestamp > 0 else (timestamp + PPM)
-        # self.clock_drift_modified_at = timestamp
-        # add_event(self.id, last_modified_timestamp + self.clock_drift_timestamp_modifier, self._perform_clock_drift)
-        # add_event(self.id, search_range_end, self._perform_clock_drift)
-        # logger.info(self.timestamp, f'{bcolors.LIGHT_GRAY}[dev_{self.id}] Next clock drift at {format_ms(last_modified_timestamp + self.clock_drift_timestamp_modifier, SIU)}{bcolors.ENDC}')
-        # logger.info(self.timestamp, f'{bcolors.LIGHT_GRAY}[dev_{self.id}] Next clock drift at {format_ms(search_range_end, SIU)}{bcolors.ENDC}')
-        # logger.info(self.timestamp, f'{bcolors.LIGHT_GRAY}[dev_{self.id}] Clock drift at {format_ms(search_range_end, SIU)}{bcolors.ENDC}')
+        self.next_transmission_time += delta
+        self.transmission_allowed_at += delta
 
+    def _add_skipped_residency(self, nr_of_cycles, delta, residency):
+        # state table has no entries for the skipped cycles, the current state would be accounted for the whole
+        # skipped period instead of the state durations of the repeated cycle
+        for state_type in residency:
+            if state_type not in self.skipped_residency:
+                self.skipped_residency[state_type] = {}
+            offset = self.skipped_residency[state_type]
+            for state_state, duration in residency[state_type].items():
+                offset[state_state] = offset.get(state_state, 0) + nr_of_cycles * duration
+            current = getattr(self.state, state_type)
+            offset[current] = offset.get(current, 0) - delta
 
     def _save_state(self):
-        self.state_table[self.state.timestamp] = deepcopy(self.state)
+        self.state_table.save(self.state)
         logger.debug(
-            self.state.timestamp,
-            f'SAVING STATE. d_state: {self.state.state}, d_substate: {self.state.substate}, '
-            f'r_state: {self.state.radio_state}, r_substate: {self.state.radio_substate}'
+            self.state.timestamp, 'SAVING STATE. d_state: %s, d_substate: %s, r_state: %s, r_substate: %s',
+            self.state.state, self.state.substate, self.state.radio_state, self.state.radio_substate,
+            category=CAT_STATE, dev_id=self.id
         )
 
-    def _change_device_state(self, state, substate=None):
+    def _set_device_state(self, state, substate=None):
         State.check_state(state)
         # no changes to the current state
         if self.state.state == state and self.state.substate == substate:
-            return
+            return False
 
         old_state = self.state.state
+        old_substate = self.state.substate
         self.state.state = state
         self.state.set_timestamp(self.timestamp)
 
         if substate is not None:
             State.check_device_substate(substate)
-            old_substate = self.state.substate
             self.state.substate = substate
-            logger.info(self.timestamp, f'dev_{self.id} device state: {old_state} => {state}, substate: {old_substate} => {substate}')
+            logger.info(self.timestamp, 'dev_%s device state: %s => %s, substate: %s => %s', self.id, old_state, state, old_substate, substate, category=CAT_STATE, dev_id=self.id)
 
         if substate is None:
-            logger.info(self.timestamp, f'dev_{self.id} device state: {old_state} => {state}, substate: {self.state.substate}')
+            logger.info(self.timestamp, 'dev_%s device state: %s => %s, substate: %s', self.id, old_state, state, self.state.substate, category=CAT_STATE, dev_id=self.id)
 
-        if state == STATE_SLEEP and not self.sbs_active:
-            if config['general']['perform_clock_drift']:
-                add_event(self.id, self.timestamp + 1, self._perform_clock_drift)
-            # logger.info(self.timestamp, f'{bcolors.LIGHT_GRAY}[dev_{self.id}] Clock drift at {format_ms(self.timestamp + 1, SIU)}{bcolors.ENDC}')
+        if TRACE is not None:
+            TRACE.state(self.timestamp, self.id, False, old_state, old_substate, state, self.state.substate, substate is not None)
 
-        self._save_state()
+        return True
 
-    def _change_radio_state(self, state, substate=None):
+    def _set_radio_state(self, state, substate=None):
         State.check_state(state)
         # no changes to the current state
         if self.state.radio_state == state and self.state.radio_substate == substate:
-            return
+            return False
 
         old_state = self.state.radio_state
+        old_substate = self.state.radio_substate
         self.state.radio_state = state
         self.state.set_timestamp(self.timestamp)
 
         if substate is not None:
             State.check_radio_substate(substate)
-            old_substate = self.state.radio_substate
             self.state.radio_substate = substate
-            logger.info(self.timestamp, f'dev_{self.id} radio state: {old_state} => {state}, substate: {old_substate} => {substate}')
+            logger.info(self.timestamp, 'dev_%s radio state: %s => %s, substate: %s => %s', self.id, old_state, state, old_substate, substate, category=CAT_STATE, dev_id=self.id)
 
         if substate is None:
-            logger.info(self.timestamp, f'dev_{self.id} radio state: {old_state} => {state}, substate: {self.state.substate}')
+            logger.info(self.timestamp, 'dev_%s radio state: %s => %s, substate: %s', self.id, old_state, state, self.state.substate, category=CAT_STATE, dev_id=self.id)
 
-        self._save_state()
+        if TRACE is not None:
+            TRACE.state(self.timestamp, self.id, True, old_state, old_substate, state, self.state.radio_substate, substate is not None)
+
+        if self.state.radio_state is STATE_ON and self.state.radio_substate is R_SUBSTATE_RX:
+            RECEIVERS.add(self.id)
+        else:
+            RECEIVERS.discard(self.id)
+
+        return True
+
+    def _change_device_state(self, state, substate=None):
+        if self._set_device_state(state, substate):
+            self._save_state()
+
+    def _change_radio_state(self, state, substate=None):
+        if self._set_radio_state(state, substate):
+            self._save_state()
+
+    def _change_state(self, state, substate, radio_state, radio_substate):
+        # device and radio transition at the same time with a single state snapshot. The radio is switched on after
+        # the device and switched off before it.
+        if state is STATE_ON:
+            changed = self._set_device_state(state, substate)
+            changed = self._set_radio_state(radio_state, radio_substate) or changed
+        else:
+            changed = self._set_radio_state(radio_state, radio_substate)
+            changed = self._set_device_state(state, substate) or changed
+
+        if changed:
+            self._save_state()
 
-    def _scheduled_log(self, log_func, msg):
-        log_func(self.timestamp, msg)
+    def _log_at(self, timestamp, level, msg, *args, category=None):
+        # log record for a future action of the device, handed over to the logger instead of being queued as an event.
+        # Like the events, timestamp is measured by the local clock
+        logger.defer(self.clock.to_global(self.timestamp, timestamp), level, msg, *args, category=category, dev_id=self.id)
 
     def _info(self):
         logger.info(
-            SIM_TIME,
-            f'dev_{self.id}, \tTYPE:{type(self).__name__}, \tSTATE: {self.state.state}, '
-            f'\tRADIO_STATE: {self.state.radio_state}, \tPOSITION: {self.position}'
+            SIM_TIME, 'dev_%s, \tTYPE:%s, \tSTATE: %s, \tRADIO_STATE: %s, \tPOSITION: %s',
+            self.id, type(self).__name__, self.state.state, self.state.radio_state, self.position, dev_id=self.id
         )
 
-    def add_packet_to_buffer(self, packet):
-        self.receive_buff.append(packet)
-        add_event(self.id, self.timestamp, self._receive)
+    def add_packet_to_buffer(self, packet, rx_dbm):
+        # the packet is shared by all receivers, its rx power is kept next to it
+        self.receive_buff.append((packet, rx_dbm))
+        self._add_event(self.timestamp, self._receive)
 
-    def mark_preamble_detected(self, receive_time, packet):
-        logger.info(self.timestamp, f'{bcolors.OKGREEN}PREAMBLE detected by dev_{self.id}!{bcolors.ENDC}')
+    def mark_preamble_detected(self, receive_time, packet, rx_dbm):
+        logger.info(
+            self.timestamp, bcolors.OKGREEN + 'PREAMBLE detected by dev_%s!' + bcolors.ENDC, self.id,
+            category=CAT_PROPAGATION, dev_id=self.id
+        )
         self.rx_active = True
-        add_event(self.id, receive_time, self.add_packet_to_buffer, packet)
+        # receive_time is given in the simulation time, it does not depend on the local clock
+        add_event(self.id, receive_time, self.add_packet_to_buffer, packet, rx_dbm)
 
     def _can_receive(self, ts):
         if self.state.state in [STATE_OFF, STATE_SLEEP]:
-            logger.info(ts, f'Device dev_{self.id} is either OFF or SLEEPING. Dropping packet')
+            logger.info(ts, 'Device dev_%s is either OFF or SLEEPING. Dropping packet', self.id, dev_id=self.id)
+            if TRACE is not None:
+                TRACE.drop(ts, self.id, DROP_DEVICE_OFF)
             return False
 
         if self.state.radio_state in [STATE_OFF, STATE_SLEEP]:
-            logger.info(ts, f'Device dev_{self.id} radio is either OFF or in sleep state. Dropping packet')
+            logger.info(ts, 'Device dev_%s radio is either OFF or in sleep state. Dropping packet', self.id, dev_id=self.id)
+            if TRACE is not None:
+                TRACE.drop(ts, self.id, DROP_RADIO_OFF)
             return False
 
         if self.state.radio_substate is not R_SUBSTATE_RX:
-            logger.info(ts, f'Device dev_{self.id} radio is not in RX substate. Dropping packet')
+            logger.info(ts, 'Device dev_%s radio is not in RX substate. Dropping packet', self.id, dev_id=self.id)
+            if TRACE is not None:
+                TRACE.drop(ts, self.id, DROP_RADIO_NOT_RX)
             return False
 
         # TODO: check later
@@ -397,80 +414,125 @@ class Device:
 
         return True
 
+    def _drop_out_of_range(self, ts, sender):
+        # devices out of range are not in the neighbour table of the sender and never get the packet, so its drop is
+        # reported without computing the propagation
+        logger.info(
+            ts, 'Packet dropped by dev_%s. dev_%s is out of range.', self.id, sender, category=CAT_PROPAGATION, dev_id=self.id
+        )
+        if TRACE is not None:
+            TRACE.drop(ts, self.id, DROP_OUT_OF_RANGE, sender)
+
+    def _report_not_listening(self, in_range, receivers):
+        # number of devices that could get the packet but are out of range or do not listen, without visiting them
+        if not logger.is_enabled_for(INFO, CAT_PROPAGATION, self.id):
+            return
+
+        if self.type is DEV_TYPE.PARENT:
+            nr_of_devices, nr_in_range, nr_listening = len(LIST_OF_DEVICES) - 1, len(in_range), len(receivers)
+        else:
+            nr_of_devices = len(PARENTS)
+            nr_in_range = sum(1 for x in PARENTS if x in in_range)
+            nr_listening = sum(1 for x in receivers if LIST_OF_DEVICES[x].type is DEV_TYPE.PARENT)
+
+        if nr_of_devices > nr_listening:
+            logger.info(
+                self.timestamp, 'Packet of dev_%s dropped by %s devices out of range and %s devices not listening.', self.id,
+                nr_of_devices - nr_in_range, nr_in_range - nr_listening, category=CAT_PROPAGATION, dev_id=self.id
+            )
+
     def _send(self, sch_packet):
         if self.__check_send_conditions() is False:
             return
 
         packet_payload = '#'.join([str(sch_packet[x]) for x in sch_packet])
-        packet = {'payload': f"{self.id}#{packet_payload}", 'rx_dbm': 0}
+        packet = Packet(f"{self.id}#{packet_payload}")
         send_interval = 0
         if self.type == DEV_TYPE.PARENT:
             send_interval = self.config['send_interval']
 
         time_on_air_ms = self.__calculate_transmission_times(packet, send_interval)
         if time_on_air_ms is False:
-            self._change_radio_state(STATE_OFF, SUBSTATE_NONE)
-            self._change_device_state(STATE_OFF, SUBSTATE_NONE)
+            self._change_state(STATE_OFF, SUBSTATE_NONE, STATE_OFF, SUBSTATE_NONE)
             return
 
-        self._change_device_state(STATE_ON, D_SUBSTATE_OP)
-        self._change_radio_state(STATE_ON, R_SUBSTATE_TX)
+        self._change_state(STATE_ON, D_SUBSTATE_OP, STATE_ON, R_SUBSTATE_TX)
         self.packets_sent += 1
-        self.bytes_sent += len(packet['payload'].encode('utf8'))
+        self.bytes_sent += packet.size
         if sch_packet[PAYLOAD.CMD] == CMD_DATA_COLLECTION_REPLY:
-            self.dc_bytes_sent += len(packet['payload'].encode('utf8'))
+            self.dc_bytes_sent += packet.size
 
         if self.type == DEV_TYPE.PARENT and sch_packet[PAYLOAD.CMD] != CMD_SYNC:
             self.recv_count = 0
-            self.expected_recv_count = len(Device._unpack_ids(sch_packet[PAYLOAD.DATA]))
-            self.total_expected_recv_count += len(Device._unpack_ids(sch_packet[PAYLOAD.DATA]))
+            self.expected_recv_count = len(sch_packet[PAYLOAD.DATA])
+            self.total_expected_recv_count += len(sch_packet[PAYLOAD.DATA])
         self.sent_pkt_seq = sch_packet[PAYLOAD.SEQ]
         self.sent_pkt_payload = sch_packet
+        if TRACE is not None:
+            TRACE.tx(self.timestamp, self.id, self.sent_pkt_seq, packet.size)
 
-        logger.info(self.timestamp, f'{bcolors.OKBLUE}dev_{self.id} is sending packet with seq_nr {self.sent_pkt_seq}...{bcolors.ENDC}')
-
-        for dev in LIST_OF_DEVICES:
+        logger.info(
+            self.timestamp, bcolors.OKBLUE + 'dev_%s is sending packet with seq_nr %s...' + bcolors.ENDC, self.id,
+            self.sent_pkt_seq, dev_id=self.id
+        )
 
-            # skip itself
-            if self.id == dev.id:
-                continue
+        # only the listening neighbours are visited, the other devices are just counted. With the propagation debug
+        # log or the trace every device is visited to report its drop on its own
+        in_range = get_neighbours(self)
+        if TRACE is not None or logger.is_enabled_for(DEBUG, CAT_PROPAGATION, self.id):
+            receivers = [x for x in range(len(LIST_OF_DEVICES)) if x != self.id]
+        else:
+            receivers = [x for x in sorted(RECEIVERS) if x in in_range]
+            self._report_not_listening(in_range, receivers)
 
+        for dev_id in receivers:
+            dev = LIST_OF_DEVICES[dev_id]
             if self.type is not DEV_TYPE.PARENT:
                 if dev.type is not DEV_TYPE.PARENT:
                     continue
 
+            if not dev._can_receive(self.timestamp):
+                continue
+
+            if dev_id not in in_range:
+                dev._drop_out_of_range(self.timestamp, self.id)
+                continue
+
             distance = get_distance(self, dev)
             delay = DELAY_MODEL.get_delay(self, dev)
-            rx_dbm, info = PROPAGATION_MODEL.calculate_rx_power(self, dev, self.lora_band.tx_dbm)
-            logger.debug(self.timestamp, f'Propagation for dev_{dev.id}: {info}')
-            dev_packet = deepcopy(packet)
-            dev_packet['rx_dbm'] = rx_dbm
+            rx_dbm, rxc = PROPAGATION_MODEL.calculate_rx_power(self, dev, self.lora_band.tx_dbm)
+            logger.debug(
+                self.timestamp, 'Propagation for dev_%s: distance=%sm, reference-attenuation=%sdb, attenuation coefficient=%sdb',
+                dev.id, distance, -PROPAGATION_MODEL.ref_loss, rxc, category=CAT_PROPAGATION, dev_id=self.id
+            )
 
             logger.debug(
-                self.timestamp,
-                f'Params for dev_{dev.id}: txPower={self.lora_band.tx_dbm}dbm, rxPower={rx_dbm}dbm, '
-                f'distance={distance}m, delay=+{round(delay * 1000000, ROUND_N)}ns'
+                self.timestamp, 'Params for dev_%s: txPower=%sdbm, rxPower=%sdbm, distance=%sm, delay=+%sns',
+                dev.id, self.lora_band.tx_dbm, rx_dbm, distance, round(delay * 1000000, ROUND_N),
+                category=CAT_PROPAGATION, dev_id=self.id
             )
 
-            if dev._can_receive(self.timestamp):
-                receive_time = self.timestamp + time_on_air_ms
-                preamble_time = self.timestamp + self.detect_preamble_ms
+            receive_time = self.timestamp + time_on_air_ms
+            preamble_time = self.timestamp + self.detect_preamble_ms
 
-                # add_event(dev.id, receive_time, dev.add_packet_to_buffer, dev_packet)
-                add_event(dev.id, preamble_time, dev.mark_preamble_detected, receive_time, dev_packet)
+            # add_event(dev.id, receive_time, dev.add_packet_to_buffer, packet, rx_dbm)
+            add_event(dev.id, preamble_time, dev.mark_preamble_detected, receive_time, packet, rx_dbm)
             
-        add_event(self.id, self.timestamp + time_on_air_ms, self._scheduled_log, logger.info, f'{bcolors.OKBLUE}...dev_{self.id} has finished sending the message.{bcolors.ENDC}')
-        add_event(
-            self.id,
-            self.timestamp + time_on_air_ms, self._scheduled_log, logger.info,
-            f'{bcolors.BMAGNETA}Next allowed transmission time for dev_{self.id}: {format_ms(self.transmission_allowed_at, SIU)}{bcolors.ENDC}'
+        self._log_at(
+            self.timestamp + time_on_air_ms, INFO, bcolors.OKBLUE + '...dev_%s has finished sending the message.' + bcolors.ENDC,
+            self.id
+        )
+        self._log_at(
+            self.timestamp + time_on_air_ms, INFO,
+            bcolors.BMAGNETA + 'Next allowed transmission time for dev_%s: %s' + bcolors.ENDC, self.id,
+            LazyMs(self.transmission_allowed_at, SIU), category=CAT_SCHEDULE
         )
 
         if self.type is DEV_TYPE.PARENT:
-            add_event(
-                self.id,
-                self.timestamp + time_on_air_ms, self._scheduled_log, logger.info,
-                f'{bcolors.BMAGNETA}Next scheduled transmission time for dev_{self.id}: {format_ms(self.next_transmission_time, SIU)}{bcolors.ENDC}'
+            self._log_at(
+                self.timestamp + time_on_air_ms, INFO,
+                bcolors.BMAGNETA + 'Next scheduled transmission time for dev_%s: %s' + bcolors.ENDC, self.id,
+                LazyMs(self.next_transmission_time, SIU), category=CAT_SCHEDULE
             )
 
         # here is the difference between commands
@@ -490,14 +552,20 @@ class Device:
                 color = bcolors.BBLUE
                 cmd_name = 'DISC'
 
-            add_event(self.id, self.timestamp + time_on_air_ms, self._scheduled_log, logger.info, f'{color}Waiting for {cmd_name} responses from devices with ID: {sch_packet[PAYLOAD.DATA]}{bcolors.ENDC}')
-            add_event(self.id, self.timestamp + time_on_air_ms + config['radio']['mode_change_ms'], self._change_radio_state, STATE_ON, R_SUBSTATE_RX)
+            self._log_at(
+                self.timestamp + time_on_air_ms, INFO, '%sWaiting for %s responses from devices with ID: %s' + bcolors.ENDC,
+                color, cmd_name, sch_packet[PAYLOAD.DATA], category=CAT_SCHEDULE
+            )
+            self._add_event(self.timestamp + time_on_air_ms + config['radio']['mode_change_ms'], self._change_radio_state, STATE_ON, R_SUBSTATE_RX)
             self.receive_window = {
                 'start': self.timestamp + time_on_air_ms + config['radio']['mode_change_ms'],
                 'end': self.timestamp + time_on_air_ms + config['radio']['mode_change_ms'] + receive_window * SIU}
-            add_event(self.id, self.receive_window['end'], self._check_if_received_all)
-            # add_event(self.id, self.timestamp + time_on_air_ms, self._scheduled_log, logger.info, f'{color}RECEIVE WINDOW: {self.receive_window["start"]:,} - {self.receive_window["end"]:,}{bcolors.ENDC}')
-            add_event(self.id, self.timestamp + time_on_air_ms, self._scheduled_log, logger.info, f'{color}RECEIVE WINDOW: {format_ms(self.receive_window["start"], SIU)} - {format_ms(self.receive_window["end"], SIU)}{bcolors.ENDC}')
+            self._add_event(self.receive_window['end'], self._check_if_received_all)
+            # self._log_at(self.timestamp + time_on_air_ms, INFO, f'{color}RECEIVE WINDOW: {self.receive_window["start"]:,} - {self.receive_window["end"]:,}{bcolors.ENDC}')
+            self._log_at(
+                self.timestamp + time_on_air_ms, INFO, '%sRECEIVE WINDOW: %s - %s' + bcolors.ENDC, color,
+                LazyMs(self.receive_window['start'], SIU), LazyMs(self.receive_window['end'], SIU), category=CAT_SCHEDULE
+            )
 
             # self._continue_receive()
             return 
@@ -516,38 +584,29 @@ class Device:
         #     return False
 
         if self.state.state is not STATE_ON:
-            logger.warning(
-                self.timestamp,
-                f'Device can\'t send a message if it is off'
-            )
+            logger.warning(self.timestamp, 'Device can\'t send a message if it is off')
             return False
 
         if self.state.radio_state is not STATE_ON:
-            logger.warning(
-                self.timestamp,
-                f'Device can\'t send a message if its radio is off'
-            )
+            logger.warning(self.timestamp, 'Device can\'t send a message if its radio is off')
             return False
 
         if self.transmission_allowed_at > SIM_TIME:
             logger.warning(
-                self.timestamp,
-                f'{bcolors.WARNING}dev_{self.id} is not allowed to transmitt before {format_ms(self.next_transmission_time, SIU)}{bcolors.ENDC}'
-                # f'{int((self.next_transmission_time - self.next_transmission_time % SIU) / SIU):,}' \
-                # f'.{self.next_transmission_time % SIU}s{bcolors.ENDC}'
+                self.timestamp, bcolors.WARNING + 'dev_%s is not allowed to transmitt before %s' + bcolors.ENDC, self.id,
+                LazyMs(self.next_transmission_time, SIU)
             )
             return False
 
     def __calculate_transmission_times(self, packet, send_interval):
-        payload_size = len(packet['payload'].encode('utf8'))
+        payload_size = packet.size
         if payload_size > TX_PARAMS['max_payload']:
             logger.error(
-                SIM_TIME,
-                f'Packet payload is too big ({payload_size}B) for SF{TX_PARAMS["sf"]} and BW {TX_PARAMS["bw"]}Hz'
+                SIM_TIME, 'Packet payload is too big (%sB) for SF%s and BW %sHz', payload_size, TX_PARAMS['sf'], TX_PARAMS['bw']
             )
             raise SimException()
 
-        time_on_air = get_time_on_air(len(packet['payload'].encode('utf8')))
+        time_on_air = get_time_on_air(packet.size)
         time_on_air_ms = time_on_air * SIU
 
         next_transmission_delay = math.ceil(time_on_air_ms / self.lora_band.duty_cycle - time_on_air_ms)
@@ -559,34 +618,20 @@ class Device:
         # GW part. We need to check if config[wcl][send_interval] is within allowed Duty Cycle
         self.next_transmission_time = self.timestamp + send_interval * SIU
         if self.type == DEV_TYPE.PARENT and next_transmission_delay > send_interval * SIU:
-            logger.info(self.timestamp, f"Send interval ({send_interval * SIU}ms) is smaller than allowed by the duty cycle ({next_transmission_delay}ms) for selected LoRa parameters!")
+            logger.info(
+                self.timestamp, 'Send interval (%sms) is smaller than allowed by the duty cycle (%sms) for selected LoRa parameters!',
+                send_interval * SIU, next_transmission_delay
+            )
             logger.info(self.timestamp, "Please fix the send interval and run the simulation again")
 
             raise SimException()        
 
         return math.ceil(time_on_air_ms)
 
-    @staticmethod
-    def _unpack_ids(id_string):
-        def _get_ids(part):
-            id_r = part.split(':')
-            id_r = [int(x) for x in id_r]
-            if len(id_r) == 1:
-                return id_r
-            if len(id_r) == 2:
-                return [x for x in range(id_r[0], id_r[len(id_r) - 1] + 1)]
-
-        ids = []
-        parts = id_string.split(',')
-        if len(parts) == 2:
-            ids += _get_ids(parts[0])
-            ids += _get_ids(parts[1])
-        if len(parts) == 1:
-            ids = _get_ids(parts[0])
-
-        return ids
-
 class LoRaLitEParentNode(Device):
+    __slots__ = ('nr_of_retransmissions', 'packet_schedule', 'energy')
+    CYCLE_COUNTERS = Device.CYCLE_COUNTERS + ('recv_count', 'total_expected_recv_count')
+
     def __init__(self, nr, position):
         self.nr_of_retransmissions = 0
         self.packet_schedule = {}
@@ -607,13 +652,10 @@ class LoRaLitEParentNode(Device):
         self.config['send_delay'] = config['wcm']['send_delay_s'] * SIU
         self.tranmission_interval = self.config['send_interval'] * SIU
 
-        add_event(self.id, self.timestamp + config['wcm']['first_op_at_s'] * SIU - config['device']['sch_on_duration_ms'], 
-            self._change_device_state, STATE_ON
-        )
-        add_event(self.id, self.timestamp + config['wcm']['first_op_at_s'] * SIU - config['device']['sch_on_duration_ms'], 
-            self._change_radio_state, STATE_ON
+        self._add_event(self.timestamp + config['wcm']['first_op_at_s'] * SIU - config['device']['sch_on_duration_ms'], 
+            self._change_state, STATE_ON, None, STATE_ON, None
         )
-        add_event(self.id, self.timestamp + config['wcm']['first_op_at_s'] * SIU, self._execute_packet_schedule)
+        self._add_event(self.timestamp + config['wcm']['first_op_at_s'] * SIU, self._execute_packet_schedule)
        
     def set_sending_interval_s(self, interval):
         self.config['send_interval'] = interval
@@ -625,44 +667,35 @@ class LoRaLitEParentNode(Device):
         self.nr_of_retransmissions = number
 
     def _execute_packet_schedule(self):
-        def _shorten_id_list(payload):
-            def _get_start_end(id_list):
-                start = f'{id_list[0]}'
-                end = f':{id_list[len(id_list) - 1]}' if len(id_list) > 1 else ''
-                return f'{start}{end}'
-
-            ids = payload.split(',')
-            ids = [int(x) for x in ids]
-            curr = ids[0] 
-            temp = [] 
-            res = [] 
-            for ele in ids: 
-                # if curr value greater than split 
-                if ele < curr: 
-                    res.append(temp) 
-                    curr = ele 
-                    temp = [] 
-                temp.append(ele) 
-            res.append(temp)
-            if len(res) == 1:
-                short = _get_start_end(res[0])
-            if len(res) == 2:
-                short = f'{_get_start_end(res[0])},{_get_start_end(res[1])}'
-
-            return short
-
         pkt_seq = self.sent_pkt_seq + 1
-        if len(self.packet_schedule) == 0:
-            packet = {PAYLOAD.SEQ: pkt_seq, PAYLOAD.CMD: CMD_SYNC, PAYLOAD.DATA: self.config['send_interval'], PAYLOAD.NR_OF_RET: 0}
-        else:
-            packet = self.packet_schedule[pkt_seq]
+        packet = self._get_scheduled_packet(pkt_seq)
+        if len(self.packet_schedule) > 0:
             if packet[PAYLOAD.CMD] != CMD_SYNC:
-                packet[PAYLOAD.DATA] = _shorten_id_list(packet[PAYLOAD.DATA])
+                # sent as ranges, e.g. '1:40,41:80'
+                packet[PAYLOAD.DATA] = IdRanges.from_ids(int(x) for x in packet[PAYLOAD.DATA].split(','))
             # logger.info(self.timestamp, f'[{pkt_seq}][{packet[PAYLOAD.CMD]}]: {packet[PAYLOAD.DATA]}')
             del self.packet_schedule[pkt_seq]
 
         self._send(packet)
 
+    def _get_scheduled_packet(self, pkt_seq):
+        if len(self.packet_schedule) == 0:
+            return {PAYLOAD.SEQ: pkt_seq, PAYLOAD.CMD: CMD_SYNC, PAYLOAD.DATA: self.config['send_interval'], PAYLOAD.NR_OF_RET: 0}
+
+        return self.packet_schedule[pkt_seq]
+
+    def _get_cycle_state(self, now):
+        return super()._get_cycle_state(now) + (self.recv_count, self.expected_recv_count)
+
+    def _skip_cycles(self, nr_of_cycles, delta, counters_diff):
+        super()._skip_cycles(nr_of_cycles, delta, counters_diff)
+        for pkt_seq in range(self.sent_pkt_seq - nr_of_cycles + 1, self.sent_pkt_seq + 1):
+            if pkt_seq in self.packet_schedule:
+                del self.packet_schedule[pkt_seq]
+
+        for x in self.receive_window:
+            self.receive_window[x] += delta
+
     def _send(self, sch_packet):
         super()._send(sch_packet)
 
@@ -676,42 +709,45 @@ class LoRaLitEParentNode(Device):
         if len(self.receive_buff) > 1:
             raise RuntimeError('There should be exactly 1 packet in the receive buffer! Something is wrong: ', self.receive_buff)
 
-        packet = self.receive_buff.pop(0)
+        packet, rx_dbm = self.receive_buff.pop(0)
         sensitivity = RX_SENSITIVITY[self.lora_band.sf]
 
         # dropping packet if its sensitivity is below receiver sensitivity
-        if packet['rx_dbm'] < sensitivity:
+        if rx_dbm < sensitivity:
             logger.info(
-                self.timestamp,
-                f'Packet dropped by dev_{self.id}. Packet rx_dbm {packet["rx_dbm"]} dBm is below receiver sensitivity '
-                f'{sensitivity} dBm.'
+                self.timestamp, 'Packet dropped by dev_%s. Packet rx_dbm %s dBm is below receiver sensitivity %s dBm.',
+                self.id, rx_dbm, sensitivity, category=CAT_PROPAGATION, dev_id=self.id
             )
+            if TRACE is not None:
+                TRACE.drop(self.timestamp, self.id, DROP_SENSITIVITY, sensitivity, rx_dbm)
             return
 
         self.packets_received += 1
         self.recv_count += 1
-        self.bytes_received += len(packet['payload'].encode('utf8'))
-        logger.info(self.timestamp, f'{bcolors.OKGREEN}Packet received by dev_{self.id}: {packet["payload"]} with RSSI: {packet["rx_dbm"]} dBm{bcolors.ENDC}')
+        self.bytes_received += packet.size
+        logger.info(
+            self.timestamp, bcolors.OKGREEN + 'Packet received by dev_%s: %s with RSSI: %s dBm' + bcolors.ENDC, self.id,
+            packet.payload, rx_dbm, dev_id=self.id
+        )
+        if TRACE is not None:
+            TRACE.rx(self.timestamp, self.id, packet, rx_dbm)
 
         if self.recv_count == self.expected_recv_count:
-            # we keep turn off the radio when we have received all expected responses
-            add_event(self.id, self.timestamp + self.config['switch_off_duration'], self._change_radio_state, STATE_OFF, SUBSTATE_NONE)
-            # we can turn off the device as well
-            add_event(self.id, self.timestamp + self.config['switch_off_duration'], self._change_device_state, STATE_SLEEP, SUBSTATE_NONE)
+            # we keep turn off the radio when we have received all expected responses and we can turn off the device as well
+            self._add_event(self.timestamp + self.config['switch_off_duration'], self._change_state, STATE_SLEEP, SUBSTATE_NONE, STATE_OFF, SUBSTATE_NONE)
             self._end_send_receive()
 
     def _end_sync(self, time_on_air_ms):
         # we keep the radio on as long as ToA duration of the packet
-        add_event(self.id, self.timestamp + time_on_air_ms, self._change_radio_state, STATE_OFF, SUBSTATE_NONE)
+        self._add_event(self.timestamp + time_on_air_ms, self._change_radio_state, STATE_OFF, SUBSTATE_NONE)
         # we can turn off the device when packet is sent
-        add_event(self.id, self.timestamp + time_on_air_ms + self.config['switch_off_duration'], self._change_device_state, STATE_SLEEP, SUBSTATE_NONE)
+        self._add_event(self.timestamp + time_on_air_ms + self.config['switch_off_duration'], self._change_device_state, STATE_SLEEP, SUBSTATE_NONE)
         self._end_send_receive()
 
     def _end_send_receive(self):
         # we need to prepare schedule for the next transmission
-        add_event(self.id, self.next_transmission_time - self.config['switch_on_duration'] + self.config['send_delay'], self._change_device_state, STATE_ON, SUBSTATE_NONE)      
-        add_event(self.id, self.next_transmission_time - self.config['switch_on_duration'] + self.config['send_delay'], self._change_radio_state, STATE_ON, SUBSTATE_NONE)
-        add_event(self.id, self.next_transmission_time + self.config['send_delay'], self._execute_packet_schedule)
+        self._add_event(self.next_transmission_time - self.config['switch_on_duration'] + self.config['send_delay'], self._change_state, STATE_ON, SUBSTATE_NONE, STATE_ON, SUBSTATE_NONE)
+        self._add_event(self.next_transmission_time + self.config['send_delay'], self._execute_packet_schedule)
 
     def _check_if_received_all(self):
         if self.state.state is STATE_SLEEP:
@@ -722,15 +758,21 @@ class LoRaLitEParentNode(Device):
 
         #if the device is still up it means that it did not receive all expected responses :(
         if self.recv_count < self.expected_recv_count:
-            logger.info(self.timestamp, f'{bcolors.WARNING}dev_{self.id} received only {self.recv_count} / {self.expected_recv_count}.{bcolors.ENDC}')
+            logger.info(
+                self.timestamp, bcolors.WARNING + 'dev_%s received only %s / %s.' + bcolors.ENDC, self.id, self.recv_count,
+                self.expected_recv_count, dev_id=self.id
+            )
+            logger.dump_context(self.timestamp, f'dev_{self.id} received only {self.recv_count} / {self.expected_recv_count}.')
             if config['general']['quit_on_failure']:
                 raise ClockDriftException(f'dev_{self.id} received only {self.recv_count} / {self.expected_recv_count}.')
 
-        add_event(self.id, self.timestamp + self.config['switch_off_duration'], self._change_radio_state, STATE_OFF, SUBSTATE_NONE)
-        add_event(self.id, self.timestamp + self.config['switch_off_duration'], self._change_device_state, STATE_SLEEP, SUBSTATE_NONE)
+        self._add_event(self.timestamp + self.config['switch_off_duration'], self._change_state, STATE_SLEEP, SUBSTATE_NONE, STATE_OFF, SUBSTATE_NONE)
         self._end_send_receive()
 
 class LoRaLitEChildNode(Device):
+    __slots__ = ('next_expected_transmission_time', 'packet_delay', 'sync', 'd', 'dc', 'sbs', 'energy')
+    CYCLE_COUNTERS = Device.CYCLE_COUNTERS + ('sync', 'd', 'dc', 'dc_bytes_sent')
+
     def __init__(self, nr, position):
         self.next_expected_transmission_time = 0.0
         self.packet_delay = 0
@@ -755,12 +797,20 @@ class LoRaLitEChildNode(Device):
         self.config['guard_time'] = config['wcl']['guard_time_ms']
         self.config['op_duration'] = config['wcl']['op_duration_ms']
 
-        add_event(self.id, self.timestamp + config['wcl']['first_op_at_s'] * SIU + self.config['switch_on_duration'], self._change_device_state, STATE_ON, SUBSTATE_NONE)
-        add_event(self.id, self.timestamp + config['wcl']['first_op_at_s'] * SIU + self.config['switch_on_duration'], self._change_radio_state, STATE_ON, R_SUBSTATE_RX)        
+        self._add_event(self.timestamp + config['wcl']['first_op_at_s'] * SIU + self.config['switch_on_duration'], self._change_state, STATE_ON, SUBSTATE_NONE, STATE_ON, R_SUBSTATE_RX)
+
+    def _get_cycle_state(self, now):
+        return super()._get_cycle_state(now) + (
+            self.last_pkt_rec_at - now, self.next_expected_transmission_time - now, self.packet_delay
+        )
+
+    def _skip_cycles(self, nr_of_cycles, delta, counters_diff):
+        super()._skip_cycles(nr_of_cycles, delta, counters_diff)
+        self.last_pkt_rec_at += delta
+        self.next_expected_transmission_time += delta
 
     def _send(self, packet):
         super()._send(packet)
-        self.sbs_active = False
 
     def _receive(self):
         if self.state.state is STATE_OFF:
@@ -770,39 +820,48 @@ class LoRaLitEChildNode(Device):
             return
 
         if self.state.radio_substate is not R_SUBSTATE_RX:
-            logger.info(self.timestamp, f'{bcolors.FAIL}dev_{self.id} can not receive because radio not in {R_SUBSTATE_RX} mode!{bcolors.ENDC}')
+            logger.info(
+                self.timestamp, bcolors.FAIL + 'dev_%s can not receive because radio not in %s mode!' + bcolors.ENDC, self.id,
+                R_SUBSTATE_RX, dev_id=self.id
+            )
             return
 
         if len(self.receive_buff) > 1:
             raise RuntimeError('There should be exactly 1 packet in the receive buffer! Something is wrong.')
 
         self.rx_active = False
-        packet = self.receive_buff.pop(0)
+        packet, rx_dbm = self.receive_buff.pop(0)
         sensitivity = RX_SENSITIVITY[self.lora_band.sf]
 
         # dropping packet if its sensitivity is below receiver sensitivity
-        if packet['rx_dbm'] < sensitivity:
+        if rx_dbm < sensitivity:
             logger.info(
-                self.timestamp,
-                f'Packet dropped by dev_{self.id}. Packet rx_dbm {packet["rx_dbm"]} dBm is below receiver sensitivity '
-                f'{sensitivity} dBm.'
+                self.timestamp, 'Packet dropped by dev_%s. Packet rx_dbm %s dBm is below receiver sensitivity %s dBm.',
+                self.id, rx_dbm, sensitivity, category=CAT_PROPAGATION, dev_id=self.id
             )
+            if TRACE is not None:
+                TRACE.drop(self.timestamp, self.id, DROP_SENSITIVITY, sensitivity, rx_dbm)
             return
 
         self.packets_received += 1
-        self.bytes_received += len(packet['payload'].encode('utf8'))
-        logger.info(self.timestamp, f'{bcolors.OKGREEN}Packet received by dev_{self.id}: {packet["payload"]} with RSSI: {packet["rx_dbm"]} dBm{bcolors.ENDC}')
-        time_on_air = get_time_on_air(len(packet['payload'].encode('utf8')))
+        self.bytes_received += packet.size
+        logger.info(
+            self.timestamp, bcolors.OKGREEN + 'Packet received by dev_%s: %s with RSSI: %s dBm' + bcolors.ENDC, self.id,
+            packet.payload, rx_dbm, dev_id=self.id
+        )
+        if TRACE is not None:
+            TRACE.rx(self.timestamp, self.id, packet, rx_dbm)
+        time_on_air = get_time_on_air(packet.size)
         time_on_air_ms = math.ceil(time_on_air * SIU)
         self.last_pkt_rec_at = self.timestamp - time_on_air_ms
 
-        payload = packet['payload'].split('#')
+        payload = packet.fields
         self.received_pkt_payload = {
             PAYLOAD.SEQ: payload[PAYLOAD.SEQ.value - 1], 
             PAYLOAD.CMD: payload[PAYLOAD.CMD.value - 1], 
             PAYLOAD.DATA: payload[PAYLOAD.DATA.value - 1], 
             PAYLOAD.NR_OF_RET: payload[PAYLOAD.NR_OF_RET.value - 1],
-            PAYLOAD.RSSI: packet['rx_dbm']
+            PAYLOAD.RSSI: rx_dbm
         }
         
         if self.received_pkt_payload[PAYLOAD.CMD] is CMD_SYNC:
@@ -819,12 +878,13 @@ class LoRaLitEChildNode(Device):
             self.next_expected_transmission_time = next_transmission_time
         
         logger.info(
-            self.timestamp, f'{bcolors.BWHITEDARK}Next possible for dev_{self.id} packet arrival time: {format_ms(self.next_expected_transmission_time, SIU)}{bcolors.ENDC}'
+            self.timestamp, bcolors.BWHITEDARK + 'Next possible for dev_%s packet arrival time: %s' + bcolors.ENDC, self.id,
+            LazyMs(self.next_expected_transmission_time, SIU), category=CAT_SCHEDULE, dev_id=self.id
         )
 
         # case where device has to respond to GW
         if self.received_pkt_payload[PAYLOAD.CMD] is not CMD_SYNC:
-            received_pkt_data = Device._unpack_ids(self.received_pkt_payload[PAYLOAD.DATA])
+            received_pkt_data = IdRanges.parse(self.received_pkt_payload[PAYLOAD.DATA])
             if self.id not in received_pkt_data:
                 self._end_receive(self.config['op_duration'])
                 return
@@ -833,21 +893,21 @@ class LoRaLitEChildNode(Device):
                 self.d += 1
                 current_cmd = CMD_DISC_REPLY
                 data = self.received_pkt_payload[PAYLOAD.RSSI]
-                max_toa_ms = math.ceil(get_time_on_air(len(f'{len(LIST_OF_DEVICES)}#{config["general"]["max_packet_nr"]}#{CMD_DISC_REPLY}#{RX_SENSITIVITY[TX_PARAMS["sf"]]}.00#0'.encode('utf8'))) * SIU)
+                max_toa_ms = get_time_on_air_ms(len(f'{len(LIST_OF_DEVICES)}#{config["general"]["max_packet_nr"]}#{CMD_DISC_REPLY}#{RX_SENSITIVITY[TX_PARAMS["sf"]]}.00#0'.encode('utf8')))
         
             if self.received_pkt_payload[PAYLOAD.CMD] == CMD_DATA_COLLECTION:
                 self.dc += 1
                 current_cmd = CMD_DATA_COLLECTION_REPLY
-                max_toa_ms = math.ceil(get_time_on_air(config['lora']['payload_size']) * SIU)
+                max_toa_ms = get_time_on_air_ms(config['lora']['payload_size'])
 
                 tmp_pkt_len = len(f'{self.id}#{self.sent_pkt_seq + 1}#{current_cmd}##0')
                 if config['lora']['bytes_to_send'] > 0:
                     to_fill = config['lora']['payload_size'] - tmp_pkt_len
                     if self.dc_bytes_sent + to_fill + tmp_pkt_len > config['lora']['bytes_to_send']:
                         to_fill = config['lora']['bytes_to_send'] - self.dc_bytes_sent - tmp_pkt_len 
-                    data = ''.join(choice(ascii_uppercase) for i in range(to_fill))
+                    data = PAYLOADS.get(to_fill)
                 else:
-                    data = ''.join(choice(ascii_uppercase) for i in range(config['lora']['payload_size'] - tmp_pkt_len))
+                    data = PAYLOADS.get(config['lora']['payload_size'] - tmp_pkt_len)
 
             self.sent_pkt_seq += 1
             packet = {PAYLOAD.SEQ: self.sent_pkt_seq, PAYLOAD.CMD: current_cmd, PAYLOAD.DATA: data, PAYLOAD.NR_OF_RET: 0}
@@ -863,26 +923,34 @@ class LoRaLitEChildNode(Device):
                 # guarded_period_ms = 2 * max_toa_ms + self.config['switch_off_duration'] + self.config['switch_on_duration']
                 guarded_period_ms = max_toa_ms + config["wcl"]["reply_gt_ms"] + self.config['switch_off_duration'] + self.config['switch_on_duration']
                 if packet_ts > self.timestamp + guarded_period_ms:
-                    self.sbs_active = True
-                    add_event(self.id, self.timestamp + self.config['switch_off_duration'], self._change_radio_state, STATE_OFF, SUBSTATE_NONE)
-                    add_event(self.id, self.timestamp + self.config['switch_off_duration'], self._change_device_state, STATE_SLEEP, SUBSTATE_NONE)
+                    self._add_event(self.timestamp + self.config['switch_off_duration'], self._change_state, STATE_SLEEP, SUBSTATE_NONE, STATE_OFF, SUBSTATE_NONE)
 
                     # we need to wake-up the device before the response slot time
                     wakeup_ts = packet_ts - guarded_period_ms
-                    add_event(self.id, wakeup_ts, self._change_device_state, STATE_ON, SUBSTATE_NONE)
-                    add_event(self.id, wakeup_ts, self._change_radio_state, STATE_ON, R_SUBSTATE_RX)
+                    self._add_event(wakeup_ts, self._change_state, STATE_ON, SUBSTATE_NONE, STATE_ON, R_SUBSTATE_RX)
 
                     sleep_ms = packet_ts - (self.timestamp + guarded_period_ms)
-                    logger.info(self.timestamp, f'{bcolors.MAGNETA}Response timeslot for dev_{self.id}: {format_ms(packet_ts, SIU)} -> ' \
-                        f'{format_ms(packet_ts + max_toa_ms + config["wcl"]["reply_gt_ms"], SIU)} [S: {sleep_ms}ms W_at:{format_ms(wakeup_ts, SIU)}]{bcolors.ENDC}')
+                    logger.info(
+                        self.timestamp, bcolors.MAGNETA + 'Response timeslot for dev_%s: %s -> %s [S: %sms W_at:%s]' + bcolors.ENDC,
+                        self.id, LazyMs(packet_ts, SIU), LazyMs(packet_ts + max_toa_ms + config['wcl']['reply_gt_ms'], SIU),
+                        sleep_ms, LazyMs(wakeup_ts, SIU), category=CAT_SCHEDULE, dev_id=self.id
+                    )
                 else:
-                    logger.info(self.timestamp, f'{bcolors.MAGNETA}Response timeslot for dev_{self.id}[{slot_nr}]: {format_ms(packet_ts, SIU)} -> {format_ms(packet_ts + max_toa_ms + config["wcl"]["reply_gt_ms"], SIU)}{bcolors.ENDC}')
+                    logger.info(
+                        self.timestamp, bcolors.MAGNETA + 'Response timeslot for dev_%s[%s]: %s -> %s' + bcolors.ENDC, self.id,
+                        slot_nr, LazyMs(packet_ts, SIU), LazyMs(packet_ts + max_toa_ms + config['wcl']['reply_gt_ms'], SIU),
+                        category=CAT_SCHEDULE, dev_id=self.id
+                    )
             else:
-                logger.info(self.timestamp, f'{bcolors.MAGNETA}Response timeslot for dev_{self.id}[{slot_nr}]: {format_ms(packet_ts, SIU)} -> {format_ms(packet_ts + max_toa_ms + config["wcl"]["reply_gt_ms"], SIU)}{bcolors.ENDC}')
+                logger.info(
+                    self.timestamp, bcolors.MAGNETA + 'Response timeslot for dev_%s[%s]: %s -> %s' + bcolors.ENDC, self.id,
+                    slot_nr, LazyMs(packet_ts, SIU), LazyMs(packet_ts + max_toa_ms + config['wcl']['reply_gt_ms'], SIU),
+                    category=CAT_SCHEDULE, dev_id=self.id
+                )
 
 
-            add_event(self.id, packet_ts + config['radio']['mode_change_ms'], self._change_radio_state, STATE_ON, R_SUBSTATE_TX)            
-            add_event(self.id, packet_ts + config['radio']['mode_change_ms'], self._send, packet)            
+            self._add_event(packet_ts + config['radio']['mode_change_ms'], self._change_radio_state, STATE_ON, R_SUBSTATE_TX)            
+            self._add_event(packet_ts + config['radio']['mode_change_ms'], self._send, packet)            
 
             return
 
@@ -890,26 +958,25 @@ class LoRaLitEChildNode(Device):
 
     def _end_receive(self, op_duration):
         # we got the packet so we can turn off radio
-        add_event(self.id, self.timestamp + op_duration + self.config['switch_off_duration'], self._change_radio_state, STATE_OFF, SUBSTATE_NONE)
-
         # device needs to execute some jobs related to the received call but after the given operational time it can
         # be turned off
-        add_event(self.id, self.timestamp + op_duration + self.config['switch_off_duration'], self._change_device_state, STATE_SLEEP, SUBSTATE_NONE)
+        self._add_event(self.timestamp + op_duration + self.config['switch_off_duration'], self._change_state, STATE_SLEEP, SUBSTATE_NONE, STATE_OFF, SUBSTATE_NONE)
 
         # we need to turn on the device so it can potentially receive the next wake-up call around the next expected
         # transmission time
         next_schedule_timestamp = math.floor(self.next_expected_transmission_time - self.config['wait_before'])
         
-        add_event(self.id, next_schedule_timestamp - self.config['switch_on_duration'], self._change_device_state, STATE_ON, SUBSTATE_NONE)
-        add_event(self.id, next_schedule_timestamp - self.config['switch_on_duration'], self._change_radio_state, STATE_ON, SUBSTATE_NONE)
-        add_event(self.id, next_schedule_timestamp, self._change_radio_state, STATE_ON, R_SUBSTATE_RX)
-        add_event(self.id, next_schedule_timestamp + self.config['guard_time'] + self.detect_preamble_ms, self.__check_if_received)
+        self._add_event(next_schedule_timestamp - self.config['switch_on_duration'], self._change_state, STATE_ON, SUBSTATE_NONE, STATE_ON, SUBSTATE_NONE)
+        self._add_event(next_schedule_timestamp, self._change_radio_state, STATE_ON, R_SUBSTATE_RX)
+        self._add_event(next_schedule_timestamp + self.config['guard_time'] + self.detect_preamble_ms, self.__check_if_received)
 
         guard_time_start = next_schedule_timestamp
         guard_time_end = next_schedule_timestamp + self.config['guard_time']
         guard_time_end_with_preamble = next_schedule_timestamp + self.config['guard_time'] + self.detect_preamble_ms
         logger.info(
-            self.timestamp, f'{bcolors.BWHITEDARK}[dev_{self.id}] next guard time: <{format_ms(guard_time_start, SIU)} : {format_ms(guard_time_end, SIU)} [{format_ms(guard_time_end_with_preamble, SIU)}]>{bcolors.ENDC}'
+            self.timestamp, bcolors.BWHITEDARK + '[dev_%s] next guard time: <%s : %s [%s]>' + bcolors.ENDC, self.id,
+            LazyMs(guard_time_start, SIU), LazyMs(guard_time_end, SIU), LazyMs(guard_time_end_with_preamble, SIU),
+            category=CAT_SCHEDULE, dev_id=self.id
         )
 
     def __check_if_received(self):
@@ -932,10 +999,12 @@ class LoRaLitEChildNode(Device):
             nr_of_lost_pkts = math.floor(interval_since_last_pkt / self.packet_delay)
             self.next_expected_transmission_time = self.last_pkt_rec_at + (nr_of_lost_pkts + 1) * self.packet_delay
             logger.info(
-                self.timestamp, 
-                f'{bcolors.WARNING}dev_{self.id} did not receive expected packet!{bcolors.ENDC} ' \
-                f'{bcolors.BWHITEDARK}Next possible for dev_{self.id} packet arrival time: {format_ms(self.next_expected_transmission_time, SIU)}{bcolors.ENDC}'
-                )
+                self.timestamp,
+                bcolors.WARNING + 'dev_%s did not receive expected packet!' + bcolors.ENDC + ' ' + bcolors.BWHITEDARK
+                + 'Next possible for dev_%s packet arrival time: %s' + bcolors.ENDC, self.id, self.id,
+                LazyMs(self.next_expected_transmission_time, SIU), dev_id=self.id
+            )
+            logger.dump_context(self.timestamp, f'dev_{self.id} did not receive expected packet!')
             if config['general']['quit_on_failure']:
                 raise ClockDriftException(f'{bcolors.WARNING}dev_{self.id} did not receive expected packet!{bcolors.ENDC}')
 
@@ -944,6 +1013,8 @@ class LoRaLitEChildNode(Device):
         return
 
 class LoRaWANGateway(Device):
+    __slots__ = ('nr_of_retransmissions', 'energy')
+
     def __init__(self, nr, position):
         self.nr_of_retransmissions = 0
         self.energy = Energy(
@@ -956,8 +1027,7 @@ class LoRaWANGateway(Device):
 
         super().__init__(nr, position, LWAN_DEV_TYPE.GW)
 
-        self._change_device_state(STATE_ON)
-        self._change_radio_state(STATE_ON, R_SUBSTATE_RX)
+        self._change_state(STATE_ON, None, STATE_ON, R_SUBSTATE_RX)
 
     def _receive(self):
         if self.state.state is STATE_OFF:
@@ -969,24 +1039,32 @@ class LoRaWANGateway(Device):
         if len(self.receive_buff) > 1:
             raise RuntimeError('There should be exactly 1 packet in the receive buffer! Something is wrong.')
         
-        packet = self.receive_buff.pop(0)
+        packet, rx_dbm = self.receive_buff.pop(0)
         sensitivity = RX_SENSITIVITY[self.lora_band.sf]
 
         # dropping packet if its sensitivity is below receiver sensitivity
-        if packet['rx_dbm'] < sensitivity:
+        if rx_dbm < sensitivity:
             logger.info(
-                self.timestamp,
-                f'Packet dropped by dev_{self.id}. Packet rx_dbm {packet["rx_dbm"]} dBm is below receiver sensitivity '
-                f'{sensitivity} dBm.'
+                self.timestamp, 'Packet dropped by dev_%s. Packet rx_dbm %s dBm is below receiver sensitivity %s dBm.',
+                self.id, rx_dbm, sensitivity, category=CAT_PROPAGATION, dev_id=self.id
             )
+            if TRACE is not None:
+                TRACE.drop(self.timestamp, self.id, DROP_SENSITIVITY, sensitivity, rx_dbm)
             return
 
         self.packets_received += 1
-        self.bytes_received += len(packet['payload'].encode('utf8'))
-        logger.info(self.timestamp, f'{bcolors.OKGREEN}Packet received by GW_{self.id}: {packet["payload"]} with RSSI: {packet["rx_dbm"]} dBm{bcolors.ENDC}')
+        self.bytes_received += packet.size
+        logger.info(
+            self.timestamp, bcolors.OKGREEN + 'Packet received by GW_%s: %s with RSSI: %s dBm' + bcolors.ENDC, self.id,
+            packet.payload, rx_dbm, dev_id=self.id
+        )
+        if TRACE is not None:
+            TRACE.rx(self.timestamp, self.id, packet, rx_dbm, gateway=True)
 
 
 class LoRaWANEndDevice(Device):
+    __slots__ = ('packet_schedule', 'rx1', 'rx2', 'rx1_timeout', 'rx2_timeout', 'last_packet', 'energy')
+
     def __init__(self, nr, position):
         self.packet_schedule = {}
         self.rx1 = {}
@@ -1013,9 +1091,8 @@ class LoRaWANEndDevice(Device):
 
         print(f'RX1 and RX2 size: {self.detect_preamble_ms} ms')
 
-        add_event(self.id, self.timestamp + first_op_at_ms - config['device']['sch_on_duration_ms'], self._change_device_state, STATE_ON)
-        add_event(self.id, self.timestamp + first_op_at_ms - config['device']['sch_on_duration_ms'], self._change_radio_state, STATE_ON)
-        add_event(self.id, self.timestamp + first_op_at_ms, self._execute_packet_schedule)
+        self._add_event(self.timestamp + first_op_at_ms - config['device']['sch_on_duration_ms'], self._change_state, STATE_ON, None, STATE_ON, None)
+        self._add_event(self.timestamp + first_op_at_ms, self._execute_packet_schedule)
        
 
     def set_sending_interval_s(self, interval):
@@ -1035,76 +1112,81 @@ class LoRaWANEndDevice(Device):
         self._send(packet)
 
     def _send(self, sch_packet):
-        packet = {'payload': sch_packet[PAYLOAD.DATA], 'rx_dbm': 0}
-        time_on_air_ms = math.ceil(get_time_on_air(len(sch_packet[PAYLOAD.DATA])) * SIU)
+        packet = Packet(sch_packet[PAYLOAD.DATA])
+        time_on_air_ms = get_time_on_air_ms(packet.size)
         next_transmission_delay = math.ceil(time_on_air_ms / self.lora_band.duty_cycle - time_on_air_ms)
         self.next_transmission_time = self.timestamp + next_transmission_delay
 
-        self._change_device_state(STATE_ON, D_SUBSTATE_OP)
-        self._change_radio_state(STATE_ON, R_SUBSTATE_TX)
+        self._change_state(STATE_ON, D_SUBSTATE_OP, STATE_ON, R_SUBSTATE_TX)
         self.packets_sent += 1
-        self.bytes_sent += len(packet['payload'].encode('utf8'))
+        self.bytes_sent += packet.size
         self.sent_pkt_seq = sch_packet[PAYLOAD.SEQ]
         self.sent_pkt_payload = sch_packet
+        if TRACE is not None:
+            TRACE.tx(self.timestamp, self.id, self.sent_pkt_seq, packet.size)
 
-        logger.info(self.timestamp, f'{bcolors.OKBLUE}dev_{self.id} is sending packet with seq_nr {self.sent_pkt_seq}...{bcolors.ENDC}')
+        logger.info(
+            self.timestamp, bcolors.OKBLUE + 'dev_%s is sending packet with seq_nr %s...' + bcolors.ENDC, self.id,
+            self.sent_pkt_seq, dev_id=self.id
+        )
 
         distance = get_distance(self, GW)
         delay = DELAY_MODEL.get_delay(self, GW)
-        rx_dbm, info = PROPAGATION_MODEL.calculate_rx_power(self, GW, self.lora_band.tx_dbm)
-        logger.debug(self.timestamp, f'Propagation for GW_{GW.id}: {info}')
-        dev_packet = deepcopy(packet)
-        dev_packet['rx_dbm'] = rx_dbm
+        rx_dbm, rxc = PROPAGATION_MODEL.calculate_rx_power(self, GW, self.lora_band.tx_dbm)
+        logger.debug(
+            self.timestamp, 'Propagation for GW_%s: distance=%sm, reference-attenuation=%sdb, attenuation coefficient=%sdb',
+            GW.id, distance, -PROPAGATION_MODEL.ref_loss, rxc, category=CAT_PROPAGATION, dev_id=self.id
+        )
 
         logger.debug(
-            self.timestamp,
-            f'Params for GW_{GW.id}: txPower={self.lora_band.tx_dbm}dbm, rxPower={rx_dbm}dbm, '
-            f'distance={distance}m, delay=+{round(delay * 1000000, ROUND_N)}ns'
+            self.timestamp, 'Params for GW_%s: txPower=%sdbm, rxPower=%sdbm, distance=%sm, delay=+%sns',
+            GW.id, self.lora_band.tx_dbm, rx_dbm, distance, round(delay * 1000000, ROUND_N),
+            category=CAT_PROPAGATION, dev_id=self.id
         )
 
         receive_time = int(round(self.timestamp + time_on_air_ms, 0))
-        add_event(GW.id, receive_time, GW.add_packet_to_buffer, dev_packet)
-
-        add_event(self.id, self.timestamp + time_on_air_ms, self._scheduled_log, logger.info, f'{bcolors.OKBLUE}...dev_{self.id} has finished sending the message.{bcolors.ENDC}')
-        add_event(self.id, 
-            self.timestamp + time_on_air_ms, self._scheduled_log, logger.info,
-            f'{bcolors.BMAGNETA}Next allowed transmission time for dev_{self.id}: {format_ms(self.next_transmission_time, SIU)}{bcolors.ENDC}'
-                # f'{int((self.next_transmission_time - self.next_transmission_time % SIU) / SIU):,}' \
-                # f'.{self.next_transmission_time % SIU}s'
+        add_event(GW.id, receive_time, GW.add_packet_to_buffer, packet, rx_dbm)
+
+        self._log_at(
+            self.timestamp + time_on_air_ms, INFO, bcolors.OKBLUE + '...dev_%s has finished sending the message.' + bcolors.ENDC,
+            self.id
+        )
+        self._log_at(
+            self.timestamp + time_on_air_ms, INFO,
+            bcolors.BMAGNETA + 'Next allowed transmission time for dev_%s: %s' + bcolors.ENDC, self.id,
+            LazyMs(self.next_transmission_time, SIU), category=CAT_SCHEDULE
         )
 
         if self.timestamp + self.config['send_interval'] < self.next_transmission_time:
             raise RuntimeError('Send interval is too small for dev_{dev.id}!') 
 
         # we keep the radio in TX mode as long as ToA duration of the packet
-        add_event(self.id, self.timestamp + time_on_air_ms + config['radio']['mode_change_ms'], self._change_radio_state, STATE_OFF, SUBSTATE_NONE)
-        add_event(self.id, self.timestamp + time_on_air_ms + SIU - config['radio']['mode_change_ms'], self._change_radio_state, STATE_ON, R_SUBSTATE_RX)
+        self._add_event(self.timestamp + time_on_air_ms + config['radio']['mode_change_ms'], self._change_radio_state, STATE_OFF, SUBSTATE_NONE)
+        self._add_event(self.timestamp + time_on_air_ms + SIU - config['radio']['mode_change_ms'], self._change_radio_state, STATE_ON, R_SUBSTATE_RX)
 
         self.rx1 = {
             'start': self.timestamp + time_on_air_ms + SIU,
             'end': self.timestamp + time_on_air_ms + SIU + self.config['rx_window']}
 
-        add_event(self.id, self.rx1['end'] + config['radio']['mode_change_ms'], self._change_radio_state, STATE_OFF, SUBSTATE_NONE)
+        self._add_event(self.rx1['end'] + config['radio']['mode_change_ms'], self._change_radio_state, STATE_OFF, SUBSTATE_NONE)
 
         self.rx2 = {
             'start': self.rx1['end'] + SIU,
             'end': self.rx1['end'] + SIU + self.config['rx_window']}
 
-        add_event(self.id, self.rx2['start'] - config['radio']['mode_change_ms'], self._change_radio_state, STATE_ON, R_SUBSTATE_RX)
-        add_event(self.id, self.rx2['end'] + config['device']['sch_off_duration_ms'], self._change_radio_state, STATE_OFF, SUBSTATE_NONE)
-        add_event(self.id, self.rx2['end'] + config['device']['sch_off_duration_ms'], self._change_device_state, STATE_SLEEP, SUBSTATE_NONE)
+        self._add_event(self.rx2['start'] - config['radio']['mode_change_ms'], self._change_radio_state, STATE_ON, R_SUBSTATE_RX)
+        self._add_event(self.rx2['end'] + config['device']['sch_off_duration_ms'], self._change_state, STATE_SLEEP, SUBSTATE_NONE, STATE_OFF, SUBSTATE_NONE)
 
         if not self.last_packet:
             # we need to prepare schedule for the next transmission
-            add_event(self.id, self.timestamp + self.config['send_interval'] - self.config['switch_on_duration'] + self.config['send_delay'], self._change_device_state, STATE_ON, SUBSTATE_NONE)            
-            add_event(self.id, self.timestamp + self.config['send_interval'] - self.config['switch_on_duration'] + self.config['send_delay'], self._change_radio_state, STATE_ON, SUBSTATE_NONE)
-            add_event(self.id, self.timestamp + self.config['send_interval'] + self.config['send_delay'], self._execute_packet_schedule)
+            self._add_event(self.timestamp + self.config['send_interval'] - self.config['switch_on_duration'] + self.config['send_delay'], self._change_state, STATE_ON, SUBSTATE_NONE, STATE_ON, SUBSTATE_NONE)
+            self._add_event(self.timestamp + self.config['send_interval'] + self.config['send_delay'], self._execute_packet_schedule)
 
         self.rx1_timeout = False
         self.rx2_timeout = False
 
         # we schedule _receive() 1s after transmission (LoRaWAN specification)
-        # add_event(self.id, self.rx1['start'], self._receive)
+        # self._add_event(self.rx1['start'], self._receive)
 
     # def _receive(self):
     #     if self.state.state is STATE_OFF:
@@ -1123,14 +1205,14 @@ class LoRaWANEndDevice(Device):
 
     #     #we have a specified receive-window where we expect the packet(s) to arrive
     #     if not msg_in_buffer and not self.rx1_timeout and self.rx1['start'] <= self.timestamp <= self.rx1['end']:
-    #         add_event(self.id, self.timestamp + config['general']['sim_sensitive_part_resolution'], self._receive)
+    #         self._add_event(self.timestamp + config['general']['sim_sensitive_part_resolution'], self._receive)
     #         return
     #     elif not self.rx1_timeout:
     #         self.rx1_timeout = True
     #         return
 
     #     if not msg_in_buffer and not self.rx2_timeout and self.rx2['start'] <= self.timestamp <= self.rx2['end']:
-    #         add_event(self.id, self.timestamp + config['general']['sim_sensitive_part_resolution'], self._receive)
+    #         self._add_event(self.timestamp + config['general']['sim_sensitive_part_resolution'], self._receive)
     #         return
     #     elif not self.rx2_timeout:
     #         self.rx2_timeout = True
@@ -1156,10 +1238,98 @@ class LoRaWANEndDevice(Device):
     #         return
 
     #     self.packets_received += 1
-    #     self.bytes_received += len(packet['payload'].encode('utf8'))
+    #     self.bytes_received += packet.size
     #     logger.info(self.timestamp, f'{bcolors.OKGREEN}Packet received by dev_{self.id}: {packet["payload"]} with RSSI: {packet["rx_dbm"]} dBm{bcolors.ENDC}')
 
 
+class CycleSkipper:
+    # Fast-forwards a LoRaLitE network through identical SYNC cycles. The network state is compared every time all
+    # devices are asleep after a parent transmission. If it is the same (relative to the current time) as after the
+    # previous transmission, the following SYNC cycles would repeat the last one exactly, so they are skipped in
+    # closed form: pending events are shifted, counters and state residency are advanced by the number of cycles.
+    def __init__(self, parent):
+        self.parent = parent
+        self.last_seq = -1
+        self.previous = None
+
+    @staticmethod
+    def _get_packet_key(dev_id, packet):
+        payload = '#'.join([str(packet[x]) for x in packet])
+        return packet[PAYLOAD.CMD], str(packet[PAYLOAD.DATA]), packet[PAYLOAD.NR_OF_RET], len(f'{dev_id}#{payload}'.encode('utf8'))
+
+    def check(self, now):
+        if self.parent.sent_pkt_seq == self.last_seq:
+            return
+
+        if any(dev.state.state is STATE_ON for dev in LIST_OF_DEVICES):
+            return
+
+        self.last_seq = self.parent.sent_pkt_seq
+        events = EVENT_LIST.pending()
+        packet_key = self._get_packet_key(self.parent.id, self.parent.sent_pkt_payload)
+        snapshot = {
+            'ts': now,
+            'fingerprint': (
+                packet_key,
+                [dev._get_cycle_state(now) for dev in LIST_OF_DEVICES],
+                [(x.timestamp - now, x.dev_id, x.opcode, x.args) for x in events]
+            ),
+            'counters': [dev._get_cycle_counters() for dev in LIST_OF_DEVICES],
+            'states': [(dev.state.state, dev.state.substate, dev.state.radio_state, dev.state.radio_substate) for dev in LIST_OF_DEVICES]
+        }
+        previous, self.previous = self.previous, snapshot
+        if packet_key[0] != CMD_SYNC or len(events) == 0:
+            return
+
+        if previous is None or previous['fingerprint'] != snapshot['fingerprint']:
+            return
+
+        cycle = now - previous['ts']
+        # the network after the skipped cycles has to end up in the same state within the simulation time
+        max_cycles = (config['general']['sim_duration_ms'] - 1 - now - (events[-1].timestamp - now)) // cycle
+        nr_of_cycles = 0
+        while nr_of_cycles < max_cycles:
+            try:
+                packet = self.parent._get_scheduled_packet(self.parent.sent_pkt_seq + nr_of_cycles + 1)
+            except KeyError:
+                break
+            if self._get_packet_key(self.parent.id, packet) != packet_key:
+                break
+            nr_of_cycles += 1
+
+        if nr_of_cycles == 0:
+            return
+
+        delta = nr_of_cycles * cycle
+        EVENT_LIST.shift(delta)
+        for dev, previous_counters, previous_state in zip(LIST_OF_DEVICES, previous['counters'], previous['states']):
+            # state table rows saved after the previous snapshot
+            start = bisect_right(dev.state_table.timestamp, previous['ts'])
+            residency = Energy.get_state_residency(previous_state, previous['ts'], dev.state_table, start, now)
+            dev._add_skipped_residency(nr_of_cycles, delta, residency)
+            counters_diff = [x - y for x, y in zip(dev._get_cycle_counters(), previous_counters)]
+            dev._skip_cycles(nr_of_cycles, delta, counters_diff)
+
+        self.last_seq = self.parent.sent_pkt_seq
+        self.previous = None
+        logger.info(
+            now, bcolors.LIGHT_GRAY + 'Fast-forwarding %s identical SYNC cycles of %s: %s -> %s' + bcolors.ENDC, nr_of_cycles,
+            LazyMs(cycle, SIU), LazyMs(now, SIU), LazyMs(now + delta, SIU)
+        )
+
+
+def build_neighbour_table():
+    # devices further than the range of the strongest transmitter never receive anything. The random shadowing is
+    # limited to its quantile, which is added to the link budget. Packets are dropped only below the sensitivity and
+    # rx power is rounded to 0.01 dBm, so the range ends where it falls below the sensitivity
+    max_distance = PROPAGATION_MODEL.calculate_max_distance(
+        max(x.lora_band.tx_dbm for x in LIST_OF_DEVICES),
+        round(min(RX_SENSITIVITY[x.lora_band.sf] for x in LIST_OF_DEVICES) - 0.01, 2), quantile=PROPAGATION_MODEL.quantile
+    )
+
+    PROPAGATION_MODEL.set_neighbour_table(calculate_neighbour_table(LIST_OF_DEVICES, max_distance))
+
+
 def log_exception(commandline, e, tb):
     with open(f'data/error.log', 'a') as outfile:
         outfile.write(f'{commandline}\n')
@@ -1170,11 +1340,6 @@ def log_drift_failure(case):
     with open(f'data/drift_case.log', 'a') as outfile:
         outfile.write(f'{config["general"]["cdppm"],config["wcl"]["guard_time_ms"],config["wcm"]["send_interval_s"],case}\n')
 
-def log_drift_issue(dev_id, timestamp):
-    with open(f'data/drift_issue.log', 'a') as outfile:
-        outfile.write(f'{commandline}\n')
-        outfile.write(f'[{dev_id}]: {format_ms(timestamp, SIU)}\n\n')
-
     
 if __name__ == '__main__':
     parser = argparse.ArgumentParser('LoRa scenario simulator for DAO')
@@ -1203,12 +1368,28 @@ if __name__ == '__main__':
     parser.add_argument('-gto', help='Sets minimal working Guard Time with relation to clock drift of a given ppm accuracy', action='store_true')
     parser.add_argument('-cdppm', help='Clock drift in ppm', type=int, default=0)
     parser.add_argument('-pcd', help='Perform clock drift', action='store_true')
+    parser.add_argument('-cdd', help='Clock drift: distribution of the per-device ppm drawn from -cdppm: fixed, uniform, normal (clipped to -cdppm)', choices=CLOCK_DRIFT_DISTRIBUTION, default=None)
     parser.add_argument('-cdp', help='Clock drift: Parent node always before the schedule by cdppm.', action='store_true')
     parser.add_argument('-cdc', help='Clock drift: Child nodes always before the schedule by cdppm.', action='store_true')
     parser.add_argument('-qof', help='Abort the simulation on failure related to the clock drift', action='store_true')
+    parser.add_argument('-shs', help='Seed of the random shadowing (used only if sigma of the propagation model is above 0)', type=int, default=None)
+    parser.add_argument('-shq', help='Random shadowing is limited to +/- this quantile of sigma, which bounds the range of the devices', type=float, default=None)
+    parser.add_argument('-pso', help='Fill DC replies and LoRaWAN payloads with filler of the right size instead of random letters', action='store_true')
+    parser.add_argument('-ff', help='Fast-forward identical SYNC cycles of a LoRaLitE simulation', action='store_true')
+    parser.add_argument('-ll', help='Log level', choices=list(LOG_LEVELS), default=None)
+    parser.add_argument('-lc', help='Log only the given categories (messages without a category are always logged)', choices=LOG_CATEGORIES, nargs='+')
+    parser.add_argument('-ld', help='Log only messages of the given device IDs (messages without a device are always logged)', type=int, nargs='+')
+    parser.add_argument('-nle', help='Do not echo the log to stdout, it is only written to the log file', action='store_true')
+    parser.add_argument('-lz', help='Compress the log on the fly', choices=list(LOG_COMPRESSION), default=None)
+    parser.add_argument('-lsd', help='Split the log into segments of the given number of simulated days', type=int, default=-1)
+    parser.add_argument('-lsk', help='Keep only the last N log segments on the disk, 0 keeps all of them', type=int, default=-1)
+    parser.add_argument('-lis', help='Index the uncompressed log every N simulated seconds for log_reader.py, 0 disables the index', type=int, default=-1)
+    parser.add_argument('-lcs', help='Keep the last N DEBUG/INFO records filtered out by the log level in memory and write them to the log on failure', type=int, default=-1)
+    parser.add_argument('-tr', help='Write a binary trace of state changes, transmissions, receptions, drops and clock drift to trace.bin', action='store_true')
     args = parser.parse_args()
 
     import os
+    import atexit
     from time import time
     import shutil
     started = time()
@@ -1262,9 +1443,50 @@ if __name__ == '__main__':
         if args.cdppm > 0:
             config['general']['cdppm'] = args.cdppm
 
+        if args.cdd is not None:
+            config['general']['cdppm_distribution'] = args.cdd
+
         if args.qof:
             config['general']['quit_on_failure'] = True
 
+        if args.ll is not None:
+            config['general']['log_level'] = args.ll
+
+        if args.lc is not None:
+            config['general']['log_categories'] = args.lc
+
+        if args.ld is not None:
+            config['general']['log_devices'] = args.ld
+
+        if args.nle:
+            config['general']['log_echo'] = False
+
+        if args.tr:
+            config['general']['trace'] = True
+
+        if args.lz is not None:
+            config['general']['log_compression'] = args.lz
+
+        if args.lsd >= 0:
+            config['general']['log_segment_days'] = args.lsd
+
+        if args.lsk >= 0:
+            config['general']['log_segment_keep'] = args.lsk
+
+        if args.lis >= 0:
+            config['general']['log_index_s'] = args.lis
+
+        if args.lcs >= 0:
+            config['general']['log_context_size'] = args.lcs
+
+        if config['general']['log_level'] not in LOG_LEVELS:
+            raise RuntimeError(f'Unknown log level: {config["general"]["log_level"]}')
+
+        logger.set_level(LOG_LEVELS[config['general']['log_level']])
+        logger.set_filters(config['general']['log_categories'], config['general']['log_devices'])
+        logger.set_echo(config['general']['log_echo'])
+        logger.set_context(config['general']['log_context_size'])
+
         sim_seconds = config['general']['sim_duration_s']
         config['general']['sim_duration_ms'] = sim_seconds * SIU
         logger.set_sim_time(config['general']['sim_duration_ms'])
@@ -1285,6 +1507,27 @@ if __name__ == '__main__':
         if args.pcd:
             config['general']['perform_clock_drift'] = True
 
+        if args.ff:
+            config['general']['fast_forward'] = True
+
+        if args.pso:
+            config['general']['payload_size_only'] = True
+
+        PAYLOADS.size_only = config['general']['payload_size_only']
+
+        if args.shs is not None:
+            config['general']['shadowing_seed'] = args.shs
+
+        if args.shq is not None:
+            config['general']['shadowing_quantile'] = args.shq
+
+        PROPAGATION_MODEL.set_shadowing(config['general']['shadowing_seed'], config['general']['shadowing_quantile'])
+        # a drawn seed is saved with the config, so the run can be repeated
+        config['general']['shadowing_seed'] = PROPAGATION_MODEL.get_shadowing_seed()
+
+        if config['general']['fast_forward'] and (args.l or config['general']['perform_clock_drift'] or PROPAGATION_MODEL.sigma > 0):
+            raise RuntimeError('Fast-forward can not be used with -l, clock drift or random shadowing!')
+
         if args.td > 0:
             # change payload size here
             min_delay_s = math.ceil(get_time_on_air(config['lora']['payload_size']) / SUBBANDS[TX_PARAMS['band']][2])
@@ -1324,7 +1567,7 @@ if __name__ == '__main__':
             bytes_to_send = args.b
             config['lora']['bytes_to_send'] = bytes_to_send
 
-        scheduler = Scheduler(config, TX_PARAMS, RX_SENSITIVITY[TX_PARAMS['sf']], SUBBANDS, TOA)
+        scheduler = Scheduler(config, TX_PARAMS, RX_SENSITIVITY[TX_PARAMS['sf']], SUBBANDS, TOA, PAYLOADS)
         if args.c and args.d:
             dw, dcw = scheduler.get_recommended_dw_dcw(sim_seconds, number_of_devices)
             config['wcm']['disc_window_s'] = dw
@@ -1365,7 +1608,16 @@ if __name__ == '__main__':
             exit()
 
         os.makedirs(DIR_PATH)
-        logger.set_file(f'{DIR_PATH}/log.txt')
+        logger.set_file(
+            f'{DIR_PATH}/log.txt',
+            config['general']['log_compression'],
+            config['general']['log_segment_days'] * 86400 * SIU,
+            config['general']['log_index_s'] * SIU,
+            config['general']['log_segment_keep']
+        )
+        if config['general']['trace']:
+            TRACE = TraceWriter(f'{DIR_PATH}/trace.bin', SIU)
+            atexit.register(TRACE.close)
         config['general']['dir_path'] = DIR_PATH
         scheduler.set_config(config)
 
@@ -1409,22 +1661,25 @@ if __name__ == '__main__':
 
         if not args.l:
             m_lou = LoRaLitEParentNode(0, config['locations'][0])
+            PARENTS.append(m_lou.id)
             if args.pcd:
                 if args.cdp:
-                    m_lou.cd_negative = True
+                    m_lou.clock.negative = True
                 if args.cdc:
-                    m_lou.cd_negative = False
+                    m_lou.clock.negative = False
             LIST_OF_DEVICES.append(m_lou)
             for i in range(1, number_of_devices):
                 lou = LoRaLitEChildNode(i, config['locations'][i])
                 if args.pcd:
                     if args.cdp:
-                        lou.cd_negative = False
+                        lou.clock.negative = False
                     if args.cdc:
-                        lou.cd_negative = True
+                        lou.clock.negative = True
                 LIST_OF_DEVICES.append(lou)
 
-            calculate_distance_matrix(LIST_OF_DEVICES)
+            build_neighbour_table()
+            if config['general']['fast_forward']:
+                CYCLE_SKIPPER = CycleSkipper(m_lou)
             if not args.c:
                 m_lou.packet_schedule = scheduler.generate_schedule_for_wcm(sim_seconds, number_of_devices)
             else:
@@ -1446,13 +1701,13 @@ if __name__ == '__main__':
                 lou.config['send_interval'] = delay * SIU
                 LIST_OF_DEVICES.append(lou)
 
-            calculate_distance_matrix(LIST_OF_DEVICES)
+            build_neighbour_table()
     except Exception as e:
         log_exception(commandline, e, traceback.format_exc())
         raise e
 
     if distance_warning is not None:
-        logger.info(SIM_TIME, f'{bcolors.WARNING}{distance_warning}{bcolors.ENDC}\n')
+        logger.info(SIM_TIME, bcolors.WARNING + '%s' + bcolors.ENDC + '\n', distance_warning)
         logger._flush()
 
     if args.s:
@@ -1463,9 +1718,11 @@ if __name__ == '__main__':
         logger.info(SIM_TIME, 'Simulation started!')
         while SIM_TIME < config['general']['sim_duration_ms']:
             try:
-                events = EVENT_LIST.popitem(0)[1]
+                _, events = EVENT_LIST.pop_timestamp()
                 for event in events:
                     event.execute()
+                if CYCLE_SKIPPER is not None:
+                    CYCLE_SKIPPER.check(SIM_TIME)
             except KeyError:
                 # end of simulation
                 SIM_TIME = config['general']['sim_duration_ms']
@@ -1480,14 +1737,16 @@ if __name__ == '__main__':
                 log_exception(commandline, e, traceback.format_exc())
 
     except KeyboardInterrupt:
+        logger.dump_context(SIM_TIME, 'Simulation interrupted!')
         logger._flush()
-        logger.info(SIM_TIME, f'{bcolors.WARNING}Simulation interrupted!{bcolors.ENDC}\n')
+        logger.info(SIM_TIME, bcolors.WARNING + 'Simulation interrupted!' + bcolors.ENDC + '\n')
         logger._flush()
         exit(0)
     except Exception as e:
+        logger.dump_context(SIM_TIME, 'Simulation failed!')
         logger._flush()
         log_exception(commandline, e, traceback.format_exc())
-        logger.info(SIM_TIME, f'{bcolors.BRED}Simulation failed!{bcolors.ENDC}\n')
+        logger.info(SIM_TIME, bcolors.BRED + 'Simulation failed!' + bcolors.ENDC + '\n')
         logger._flush()
         raise e
 
@@ -1517,14 +1776,16 @@ if __name__ == '__main__':
     if LIST_OF_DEVICES[0].type is DEV_TYPE.PARENT and LIST_OF_DEVICES[0].packets_received < LIST_OF_DEVICES[0].total_expected_recv_count:
         sim_msg = f'{bcolors.BRED}Simulation failed!{bcolors.ENDC}\n'
         time_color = bcolors.BRED
+        logger.dump_context(SIM_TIME, 'Simulation failed!')
 
     logger.always(SIM_TIME, sim_msg)
 
     _print_dev_stats()
 
     for dev in LIST_OF_DEVICES:
-        dev.energy.calculate_energy_usage(dev.initial_state, dev.state_table, dev.id, sim_seconds)
+        dev.energy.calculate_energy_usage(dev.state_table, dev.id, sim_seconds, dev.skipped_residency)
 
     ended = time()
     logger.always(SIM_TIME, f'{time_color}Execution time: {math.ceil(ended - started)}s.{bcolors.ENDC}\n')
+    logger.close_file()
 
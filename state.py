@@ -1,6 +1,10 @@
+from array import array
+from itertools import islice
 from definitions import *
 
 class State:
+    __slots__ = ('state', 'substate', 'radio_state', 'radio_substate', '_dev_id', 'timestamp')
+
     def __init__(self, dev_id, d_state=STATE_SLEEP, d_substate=SUBSTATE_NONE, r_state=STATE_OFF, r_substate=SUBSTATE_NONE):
         self.state = d_state
         self.substate = d_substate
@@ -26,3 +30,41 @@ class State:
     def check_radio_substate(substate):
         if substate not in R_SUBSTATE:
             raise RuntimeError(f'Given radio substate: {substate} is not valid!')
+
+
+class StateTable:
+    # Saved device/radio states as parallel columns, one row per state change: timestamp (8 B) and the codes of the
+    # device state, device substate, radio state and radio substate (1 B each). Rows are appended in the order of
+    # their timestamps, a row saved at the timestamp of the last one replaces it.
+    __slots__ = ('timestamp', 'state', 'substate', 'radio_state', 'radio_substate')
+
+    def __init__(self):
+        self.timestamp = array('q')
+        self.state = array('b')
+        self.substate = array('b')
+        self.radio_state = array('b')
+        self.radio_substate = array('b')
+
+    def __len__(self):
+        return len(self.timestamp)
+
+    def save(self, state):
+        if self.timestamp and self.timestamp[-1] == state.timestamp:
+            self.state[-1] = state.state
+            self.substate[-1] = state.substate
+            self.radio_state[-1] = state.radio_state
+            self.radio_substate[-1] = state.radio_substate
+            return
+
+        self.timestamp.append(state.timestamp)
+        self.state.append(state.state)
+        self.substate.append(state.substate)
+        self.radio_state.append(state.radio_state)
+        self.radio_substate.append(state.radio_substate)
+
+    def rows(self, start=0):
+        # (timestamp, state, substate, radio_state, radio_substate) rows from the given index on, without copying
+        # the columns
+        return zip(*[
+            islice(x, start, None) for x in [self.timestamp, self.state, self.substate, self.radio_state, self.radio_substate]
+        ])
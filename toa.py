@@ -1,5 +1,9 @@
 import math
-from logger import FakeLogger
+import numpy as np
+from logger import FakeLogger, DEBUG
+
+# LoRa payloads are at most 255 bytes long
+TOA_TABLE_SIZE = 256
 
 class ToA:
     def __init__(self, sf, bw, preamble, cr, ldro, crc, hd, logger=None):
@@ -14,7 +18,12 @@ class ToA:
             self.logger = FakeLogger()
         else:
             self.logger = logger
+        # only the computations for a given logger are logged, so without one the tables are always used
+        self._log = logger is not None
 
+        # time on air of every possible payload size for these settings
+        self._table = self.get_time_on_air_table(sf, bw, cr, range(TOA_TABLE_SIZE), preamble, ldro, crc, hd)[0, 0, 0].tolist()
+        self._tables_ms = {}
 
     def get_symbols_time(self, symbols=5):
         # symbol duration
@@ -25,7 +34,27 @@ class ToA:
 
         return t_preamble
 
+    def _is_logged(self):
+        return self._log and self.logger.is_enabled_for(DEBUG)
+
     def get_time_on_air(self, pkt_size, sim_time=0):
+        # the table is bypassed only to log the computation
+        if pkt_size < TOA_TABLE_SIZE and not self._is_logged():
+            return self._table[pkt_size]
+
+        return self._calculate_time_on_air(pkt_size, sim_time, True)
+
+    def get_time_on_air_ms(self, pkt_size, second_in_unit, sim_time=0):
+        # time on air rounded up to whole units of the simulation time
+        if pkt_size >= TOA_TABLE_SIZE or self._is_logged():
+            return math.ceil(self.get_time_on_air(pkt_size, sim_time) * second_in_unit)
+
+        if second_in_unit not in self._tables_ms:
+            self._tables_ms[second_in_unit] = [math.ceil(x * second_in_unit) for x in self._table]
+
+        return self._tables_ms[second_in_unit][pkt_size]
+
+    def _calculate_time_on_air(self, pkt_size, sim_time=0, log=False):
         # symbol duration
         t_symbol = math.pow(2, int(self.sf)) / self.bw
 
@@ -49,19 +78,34 @@ class ToA:
         # payload duration
         t_payload = payload_symbol_count * t_symbol
 
-        self.logger.debug(
-            sim_time,
-            f'SF: {self.sf}, headerDisabled: {self.hd}, codingRate: {self.cr}, '
-            f'bandwidthHz: {self.bw}, nPreamble: {self.preamble}, crcEnabled: {self.crc}, '
-            f'lowDataRateOptimizationEnabled: {ldro}'
-        )
-        self.logger.debug(sim_time, f'Packet of size {pkt_size} bytes')
-        self.logger.debug(
-            sim_time,
-            f'Time computation: num = {num}, den = {den}, payloadSymbNb = {payload_symbol_count}, tSym = {t_symbol}'
-        )
-        self.logger.debug(sim_time, f'\ttPreamble = {t_preamble}')
-        self.logger.debug(sim_time, f'\ttPayload = {t_payload}')
-        self.logger.debug(sim_time, f'\tTotal time = {t_preamble + t_payload}')
+        if log and self._is_logged():
+            self.logger.debug(
+                sim_time,
+                'SF: %s, headerDisabled: %s, codingRate: %s, bandwidthHz: %s, nPreamble: %s, crcEnabled: %s, '
+                'lowDataRateOptimizationEnabled: %s', self.sf, self.hd, self.cr, self.bw, self.preamble, self.crc, ldro
+            )
+            self.logger.debug(sim_time, 'Packet of size %s bytes', pkt_size)
+            self.logger.debug(
+                sim_time,
+                'Time computation: num = %s, den = %s, payloadSymbNb = %s, tSym = %s', num, den, payload_symbol_count, t_symbol
+            )
+            self.logger.debug(sim_time, '\ttPreamble = %s', t_preamble)
+            self.logger.debug(sim_time, '\ttPayload = %s', t_payload)
+            self.logger.debug(sim_time, '\tTotal time = %s', t_preamble + t_payload)
 
         return t_preamble + t_payload
+
+    @staticmethod
+    def get_time_on_air_table(sf, bw, cr, pkt_size, preamble=8, ldro=0, crc=1, hd=0):
+        # time on air in seconds of all combinations of the given SFs x BWs x CRs x payload sizes in one NumPy pass,
+        # e.g. the lookup table of a ToA. The result has the shape (len(sf), len(bw), len(cr), len(pkt_size))
+        sf, bw, cr, pkt_size = np.ix_(*[np.atleast_1d(np.asarray(x, dtype=float)) for x in [sf, bw, cr, pkt_size]])
+        t_symbol = np.power(2.0, sf) / bw
+        t_preamble = (preamble + 4.25) * t_symbol
+        ldro = np.where(t_symbol > 0.016, 1, ldro)
+
+        num = 8 * pkt_size - 4 * sf + 28 + 16 * crc - 20 * hd
+        den = 4 * (sf - 2 * ldro)
+        payload_symbol_count = 8 + np.maximum(np.ceil(num / den) * (cr + 4), 0)
+
+        return t_preamble + payload_symbol_count * t_symbol
@@ -1,7 +1,10 @@
 from re import split
-from random import getrandbits
+from random import getrandbits, Random
+from string import ascii_uppercase
+from enum import Enum
 
 ROUND_N = 4
+PAYLOAD_POOL_SIZE = 65536
 
 class bcolors:
     HEADER = '\033[95m'
@@ -47,5 +50,53 @@ def format_ms(time_ms, second_in_unit):
     # f'{int((self.next_expected_transmission_time  - self.next_expected_transmission_time  % config["general"]["second_in_unit"]) / config["general"]["second_in_unit"]):,}' \
     # f'.{self.next_expected_transmission_time % config["general"]["second_in_unit"]}s'
 
+class LazyMs:
+    # argument of a %-style log record, the time is formatted by format_ms() only if the record is written
+    __slots__ = ('time_ms', 'second_in_unit')
+
+    def __init__(self, time_ms, second_in_unit):
+        self.time_ms = time_ms
+        self.second_in_unit = second_in_unit
+
+    def __str__(self):
+        return format_ms(self.time_ms, self.second_in_unit)
+
+class LazyArgs:
+    # arguments of an event in a %-style log record, enums (e.g. states) are shown by their names
+    __slots__ = ('args',)
+
+    def __init__(self, args):
+        self.args = args
+
+    def __str__(self):
+        return str(tuple(x.name if isinstance(x, Enum) else x for x in self.args))
+
 def get_random_true_false():
-    return bool(getrandbits(1))
\ No newline at end of file
+    return bool(getrandbits(1))
+
+class PayloadFactory:
+    # Content of the payloads is never inspected, only their size matters. Payloads are slices of one pool of random
+    # letters drawn on the first use, or just filler with size_only.
+    def __init__(self, size_only=False, pool_size=PAYLOAD_POOL_SIZE):
+        self.size_only = size_only
+        self._pool_size = pool_size
+        self._pool = None
+        self._random = None
+
+    def get(self, size):
+        if size <= 0:
+            return ''
+
+        if self.size_only:
+            return 'X' * size
+
+        if self._pool is None:
+            # own generator seeded from the global one, so the runs stay reproducible with a seeded random module
+            self._random = Random(getrandbits(64))
+            self._pool = ''.join(self._random.choices(ascii_uppercase, k=self._pool_size))
+
+        if size > self._pool_size:
+            return (self._pool * (size // self._pool_size + 1))[:size]
+
+        start = self._random.randrange(self._pool_size - size + 1)
+        return self._pool[start:start + size]
\ No newline at end of file